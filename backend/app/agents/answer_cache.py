@@ -0,0 +1,86 @@
+"""Opt-in cache of complete answers to common opening questions.
+
+Only a session's first turn (no window, no summary) is eligible, since later answers
+depend on the conversation. Keys cover the normalised message, a hash of the system
+prompt and chat model, and the knowledge index version, so re-ingesting (which bumps
+the version) or editing the prompt invalidates every entry. Entries live in the
+``KnowledgeCache`` table next to cached retrievals and expire through its TTL.
+"""
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from haystack.dataclasses import ChatMessage
+
+from agents import prompts
+from knowledge.retrieval_cache import normalize_query, retrieval_cache
+from utils.settings import bool_env, positive_int_env
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_ENABLED = bool_env("ANSWER_CACHE_ENABLED", False)
+ANSWER_CACHE_TTL_SECONDS = positive_int_env("ANSWER_CACHE_TTL_SECONDS", 6 * 3600)
+ANSWER_STREAM_CHUNK_CHARS = positive_int_env("ANSWER_STREAM_CHUNK_CHARS", 48)
+
+# Answers that called anything else (user info, scheduling, clock) are not reusable.
+CACHEABLE_TOOLS = frozenset({"search_docs"})
+
+
+@dataclass
+class AnswerCacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+
+
+class AnswerCache:
+    def __init__(self, model: str, ttl: int = ANSWER_CACHE_TTL_SECONDS) -> None:
+        self.ttl = ttl
+        self.prompt_hash = hashlib.sha256(f"{model}\n{prompts.SYSTEM_PROMPT}".encode()).hexdigest()[:16]
+        self.stats = AnswerCacheStats()
+
+    def key(self, message: str) -> str:
+        raw = f"{retrieval_cache.index_version()}|{self.prompt_hash}|{normalize_query(message)}"
+        return "A#" + hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, message: str) -> Optional[str]:
+        try:
+            item = retrieval_cache.table.get_item(Key={"cache_key": self.key(message)}).get("Item")
+        except Exception as e:
+            logger.warning("Answer cache read failed: %s", e)
+            return None
+        if not item or int(item.get("expires_at", 0)) <= time.time():
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return item["answer"]
+
+    def put(self, message: str, answer: str, replies: List[ChatMessage]) -> None:
+        """Store ``answer`` unless the turn used a tool whose result may not be reused."""
+        used = {c.tool_name for m in replies for c in m.tool_calls}
+        if not answer or not used <= CACHEABLE_TOOLS:
+            return
+        try:
+            retrieval_cache.table.put_item(Item={
+                "cache_key": self.key(message),
+                "answer": answer,
+                "expires_at": int(time.time()) + self.ttl,
+            })
+            self.stats.stores += 1
+        except Exception as e:
+            logger.warning("Answer cache write failed: %s", e)
+
+
+def stream_answer(answer: str, on_stream: Callable[[str], None], chunk_chars: int = ANSWER_STREAM_CHUNK_CHARS) -> None:
+    """Replay a cached answer as a sequence of chunks, split after whitespace where possible."""
+    start = 0
+    while start < len(answer):
+        end = min(len(answer), start + chunk_chars)
+        if end < len(answer):
+            space = answer.rfind(" ", start, end)
+            if space > start:
+                end = space + 1
+        on_stream(answer[start:end])
+        start = end
@@ -1,68 +1,251 @@
 from __future__ import annotations
 
+import contextvars
+import dataclasses
+import functools
 import logging
+from time import perf_counter
 from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 
 from haystack.components.agents import Agent
-from haystack.dataclasses import ChatMessage
+from haystack.dataclasses import ChatMessage, ChatRole
+from haystack.tools import Tool
 from haystack_integrations.components.generators.anthropic import AnthropicChatGenerator
+from opentelemetry import context as otel_context
 
 import agents.prompts as prompts
+from agents.answer_cache import ANSWER_CACHE_ENABLED, AnswerCache, stream_answer
+from components.cancellable_chat_generator import CancellableChatGenerator
+from knowledge import prefetch
 from memory.memory import MemoryManager
+from memory.tokens import count_tokens
+from rate_limiter.spend_limiter import SpendAccount, TokenUsage
 from tools import time
 from tools.scheduler import schedule_meeting
-from tools.search_docs import make_search_docs
+from tools.search_docs import SEARCH_TOP_K, SEARCH_TOP_N, make_search_docs
 from tools.user_info import make_update_user_info_tool
-from tracing_utils import log_ctx
+from tracing_utils import log_ctx, span
+from utils import resources
+from utils.cancellation import CancellationToken, TurnCancelled
+from utils.settings import positive_float_env, positive_int_env
 
 logger = logging.getLogger(__name__)
 
 MAX_TOKENS_RESPONSE = 512
-
-
-def chat(session_id: str, message: str, on_stream: Callable[[str], None]) -> str:
+CHAT_MODEL = "claude-sonnet-4-20250514"
+
+# Tool calls from one model step run concurrently on the Agent's ToolInvoker pool.
+TOOL_MAX_WORKERS = positive_int_env("TOOL_MAX_WORKERS", 4)
+TOOL_TIMEOUT_SECONDS = positive_float_env("TOOL_TIMEOUT_SECONDS", 15.0)
+# None: no timeout. A booking abandoned on timeout still completes in the background, and
+# the model, told the call failed, could book the same meeting again.
+TOOL_TIMEOUTS: dict[str, float | None] = {
+    "schedule_meeting": None,
+}
+
+
+def chat(
+        session_id: str,
+        message: str,
+        on_stream: Callable[[str], None],
+        cancellation: CancellationToken | None = None,
+        spend: SpendAccount | None = None,
+        mem: MemoryManager | None = None,
+        on_usage: Callable[[TokenUsage], None] | None = None,
+) -> str:
+    """Run one chat turn.
+
+    Raises ``TurnCancelled`` if ``cancellation`` fires; the turn is then not persisted.
+    With ``spend``, an estimate of the turn's token cost is reserved up front (raising
+    ``SpendLimitExceeded`` if it does not fit) and settled with the reported usage.
+    With ``ANSWER_CACHE_ENABLED``, a session's first message may be answered from the
+    answer cache, streamed through ``on_stream`` without calling the model.
+    With ``RAG_PREFETCH_ENABLED``, retrieval for the message starts alongside the first
+    model call and ``search_docs`` reuses it when the model searches for the same thing.
+    ``mem`` reuses a memory already loaded by the caller; ``on_usage`` receives the
+    turn's reported token usage.
+    """
+    cancellation = cancellation or CancellationToken()
     logger.info("inside chat: %s", message)
-    mem = MemoryManager(
+    mem = mem or MemoryManager(
         session_id=session_id,
     )
 
     memory_snapshot = mem.get_memory()
     logger.info(f"memory snapshot {memory_snapshot}")
 
-    messages = _map_messages(memory_snapshot["conversation"])
-    messages.append(ChatMessage.from_user(prompts.llm_prompt(message)))
-
-    logger.info("Messages: %s", messages, **log_ctx(session_id=session_id))
-
-    llm = AnthropicChatGenerator(
-        model="claude-sonnet-4-20250514",
-        streaming_callback=lambda chunk: on_stream(chunk.content) if chunk.content else None,
-        generation_kwargs={"temperature": 0.7, "top_p": 0.9},
+    answer_cache = _answer_cache() if ANSWER_CACHE_ENABLED and not mem.window and not mem.summary else None
+    if answer_cache is not None:
+        cached = answer_cache.get(message)
+        if cached is not None:
+            logger.info("Answer cache hit: %s", answer_cache.stats, **log_ctx(session_id=session_id))
+            stream_answer(cached, on_stream)
+            cancellation.raise_if_cancelled()
+            mem.save_turn(user_msg=message, assistant_msg=cached)
+            return cached
+
+    # Cacheable segments, most stable first: persona, summary, window, then this turn's question.
+    system_messages = prompts.system_messages(memory_snapshot)
+    window = prompts.window_messages(memory_snapshot)
+    if window:
+        window[-1].meta.update(prompts.CACHE_BREAKPOINT)
+    user_prompt = prompts.llm_prompt(message)
+    # The Agent re-sends everything up to here on each tool iteration; let those read it back.
+    messages = system_messages + window + [ChatMessage.from_user(user_prompt, meta=dict(prompts.CACHE_BREAKPOINT))]
+
+    if spend is not None:
+        spend.reserve(TokenUsage(
+            input_tokens=sum(count_tokens(m.text) for m in system_messages)
+            + mem.window_tokens + count_tokens(user_prompt),
+            output_tokens=MAX_TOKENS_RESPONSE,
+        ))
+
+    logger.info("Messages: %s", messages[len(system_messages):], **log_ctx(session_id=session_id))
+
+    # Retrieve for the raw message while the first model call decides whether to search.
+    prefetched = prefetch.start(message, SEARCH_TOP_K, SEARCH_TOP_N)
+
+    generator = CancellableChatGenerator(_chat_generator(), cancellation)
+    try:
+        with span("agent.run", session_id=session_id, model=CHAT_MODEL) as s:
+            # Built inside the span: the tools' spans are parented to the context they capture.
+            agent = Agent(
+                chat_generator=generator,
+                tools=_instrument_tools(_guard_tools([
+                    make_update_user_info_tool(mem),
+                    schedule_meeting,
+                    make_search_docs(session_id, memory_snapshot, prefetched),
+                    time.convert_time,
+                    time.get_current_time
+                ], cancellation)),
+                tool_invoker_kwargs={"max_workers": TOOL_MAX_WORKERS},
+            )
+            result = agent.run(
+                messages=messages,
+                streaming_callback=lambda chunk: on_stream(chunk.content) if chunk.content else None,
+            )
+            usage = TokenUsage.from_replies(result["messages"])
+            s.set_attribute("agent.llm_calls", sum(1 for m in result["messages"] if m.role == ChatRole.ASSISTANT))
+            s.set_attribute("agent.tool_calls", sum(len(m.tool_calls) for m in result["messages"]))
+            s.set_attribute("agent.input_tokens", usage.input_tokens)
+            s.set_attribute("agent.output_tokens", usage.output_tokens)
+            s.set_attribute("agent.cache_read_tokens", usage.cache_read_tokens)
+            s.set_attribute("agent.cache_write_tokens", usage.cache_write_tokens)
+    except Exception:
+        if spend is not None:
+            # Charge what the model calls reported before the failure, not the full estimate.
+            spend.settle(generator.usage)
+        # Haystack wraps component errors, so surface the cancellation explicitly.
+        cancellation.raise_if_cancelled()
+        raise
+    finally:
+        if prefetched is not None:
+            prefetched.close()
+            logger.info("RAG prefetch stats: %s", prefetch.stats, **log_ctx(session_id=session_id))
+
+    logger.info(
+        "Prompt cache: read=%d created=%d uncached=%d",
+        usage.cache_read_tokens, usage.cache_write_tokens, usage.input_tokens,
+        **log_ctx(session_id=session_id),
     )
+    if spend is not None:
+        spend.settle(usage)
+    if on_usage is not None:
+        on_usage(usage)
 
-    result = Agent(
-        chat_generator=llm,
-        system_prompt=prompts.system_prompt(memory_snapshot),
-        tools=[
-            make_update_user_info_tool(mem),
-            schedule_meeting,
-            make_search_docs(session_id, memory_snapshot),
-            time.convert_time,
-            time.get_current_time
-        ]).run(messages=messages)
-
+    cancellation.raise_if_cancelled()
     assistant_response = result["messages"][-1].text
     mem.save_turn(user_msg=message, assistant_msg=assistant_response)
+    if answer_cache is not None:
+        answer_cache.put(message, assistant_response, result["messages"])
     logger.info("Messages sent: %s", assistant_response, **log_ctx(session_id=session_id))
 
     return assistant_response
 
 
-def _map_messages(messages):
-    chat_messages = []
-    for m in messages:
-        if m["role"] == "user":
-            chat_messages.append(ChatMessage.from_user(m["message"]))
-        else:
-            chat_messages.append(ChatMessage.from_assistant(m["message"]))
-    return chat_messages
+def _chat_generator() -> AnthropicChatGenerator:
+    """Container-wide generator; its Anthropic client keeps the HTTP connection pool warm.
+
+    The Agent itself is built per turn because its tools close over the session's memory.
+    """
+    return resources.get_or_create(
+        ("anthropic", CHAT_MODEL),
+        lambda: AnthropicChatGenerator(
+            model=CHAT_MODEL,
+            generation_kwargs={"temperature": 0.7, "top_p": 0.9},
+        ),
+    )
+
+
+def _answer_cache() -> AnswerCache:
+    return resources.get_or_create(("answer_cache", CHAT_MODEL), lambda: AnswerCache(CHAT_MODEL))
+
+
+def _guard_tools(tools: list[Tool], cancellation: CancellationToken) -> list[Tool]:
+    """Make every tool refuse to run once the turn has been cancelled.
+
+    A refused call does none of its work (no search, no calendar write), but the Agent's
+    ToolInvoker turns the ``TurnCancelled`` into a tool-error message rather than
+    propagating it. The loop then stops at the next model call, where
+    ``CancellableChatGenerator`` raises before any request is sent.
+    """
+
+    def guard(function):
+        @functools.wraps(function)
+        def guarded(*args, **kwargs):
+            cancellation.raise_if_cancelled()
+            return function(*args, **kwargs)
+
+        return guarded
+
+    return [dataclasses.replace(t, function=guard(t.function)) for t in tools]
+
+
+def _instrument_tools(tools: list[Tool]) -> list[Tool]:
+    """Give every tool call a span and, unless ``TOOL_TIMEOUTS`` says otherwise, a timeout.
+
+    A call that times out is reported to the model as a tool error (the Agent does not
+    raise on tool failures), so a slow dependency cannot hold the whole turn. The worker
+    thread itself cannot be interrupted and finishes in the background.
+
+    The ToolInvoker's threads do not inherit the caller's context, so the trace context
+    current when the tools are instrumented is attached around each call.
+    """
+    parent = otel_context.get_current()
+
+    def instrument(name: str, function):
+        timeout = TOOL_TIMEOUTS.get(name, TOOL_TIMEOUT_SECONDS)
+
+        @functools.wraps(function)
+        def instrumented(*args, **kwargs):
+            started = perf_counter()
+            token = otel_context.attach(parent)
+            try:
+                with span(f"tool.{name}", tool=name) as s:
+                    try:
+                        if timeout is None:
+                            return function(*args, **kwargs)
+                        s.set_attribute("timeout_s", timeout)
+                        future = _tool_executor().submit(contextvars.copy_context().run, function, *args, **kwargs)
+                        try:
+                            return future.result(timeout=timeout)
+                        except FutureTimeout:
+                            s.set_attribute("tool.timed_out", True)
+                            raise TimeoutError(f"tool {name} did not finish within {timeout:.0f}s")
+                    finally:
+                        s.set_attribute("tool.duration_ms", (perf_counter() - started) * 1000)
+            finally:
+                otel_context.detach(token)
+
+        return instrumented
+
+    return [dataclasses.replace(t, function=instrument(t.name, t.function)) for t in tools]
+
+
+def _tool_executor() -> ThreadPoolExecutor:
+    # Room for a full step of calls plus stragglers that outlived their timeout.
+    return resources.get_or_create(
+        ("executor", "tools"),
+        lambda: ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS * 2, thread_name_prefix="tool"),
+    )
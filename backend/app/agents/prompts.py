@@ -1,5 +1,10 @@
 from __future__ import annotations
 
+from haystack.dataclasses import ChatMessage
+
+# Anthropic caches the request prefix up to each marked block (at most four per request).
+CACHE_BREAKPOINT = {"cache_control": {"type": "ephemeral"}}
+
 SYSTEM_PROMPT = """\
 You are GonçaloBot, speaking as software engineer Gonçalo Fonseca in first person.
 
@@ -84,14 +89,46 @@ Trigger when the user asks to meet or shows intent (e.g., "can we chat?", "book
 """
 
 
-def system_prompt(memory: dict):
-    prompt = SYSTEM_PROMPT
+SMALL_TALK_PROMPT = """\
+You are GonçaloBot, speaking as software engineer Gonçalo Fonseca in first person.
+This turn is small talk: a greeting, thanks, a goodbye, a short reaction or an introduction.
+- Reply in one or two short, friendly sentences. Plain English, lightly humorous.
+- If the person shares their name, company or role, call tool `update_user_info` with it.
+- Early in the chat, casually ask for their name and company/role once.
+- Do not state facts about my work or life, and never mention being an AI.
+"""
+
+ROUTER_PROMPT = """\
+Classify the last message a visitor sent to a chatbot that speaks as a software engineer.
+Answer with exactly one word:
+small_talk - greeting, thanks, goodbye, short reaction, or the visitor introducing themselves
+full - anything else: questions about the engineer, their work or life, meetings, time, or unclear
+"""
+
+
+def system_messages(memory: dict) -> list[ChatMessage]:
+    """The system prompt as cacheable segments: the static persona, then the session summary.
+
+    Each segment ends at a cache breakpoint, so the persona is shared by every session and
+    the summary is re-read from the cache until the next compaction rewrites it.
+    """
+    messages = [ChatMessage.from_system(SYSTEM_PROMPT, meta=dict(CACHE_BREAKPOINT))]
 
     summary = memory["summary"].strip()
     if summary:
-        prompt = f"{prompt} \n\n [Past Convo Summary]{summary}"
+        messages.append(ChatMessage.from_system(f"[Past Convo Summary]{summary}", meta=dict(CACHE_BREAKPOINT)))
+
+    return messages
+
 
-    return prompt
+def window_messages(memory: dict) -> list[ChatMessage]:
+    messages = []
+    for m in memory["conversation"]:
+        if m["role"] == "user":
+            messages.append(ChatMessage.from_user(m["message"]))
+        else:
+            messages.append(ChatMessage.from_assistant(m["message"]))
+    return messages
 
 
 def llm_prompt(user_message: str):
@@ -0,0 +1,324 @@
+"""Route each turn to the cheapest path that can answer it.
+
+- ``time``: "what time is it in Lisbon?" is answered from ``tools.time`` without a model.
+- ``small_talk``: greetings, thanks, reactions and introductions go to Nova Micro with a
+  short prompt and only the ``update_user_info`` tool.
+- ``full``: everything else (knowledge, scheduling, anything unclear) goes to
+  ``chat_agent.chat``.
+
+Local heuristics decide the obvious cases. A reply to a question the bot just asked
+("Tuesday works", "I'm John, john@acme.com") continues that flow and stays on the full
+path. Any other short message they cannot place is given to Nova Micro to classify. Any
+routing error also falls back to the full path.
+"""
+from __future__ import annotations
+
+import functools
+import logging
+import re
+import threading
+import zoneinfo
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import datetime
+from time import perf_counter
+
+from haystack.components.agents import Agent
+from haystack.dataclasses import ChatMessage
+from haystack_integrations.components.generators.amazon_bedrock import AmazonBedrockChatGenerator
+
+import agents.chat_agent as chat_agent
+import agents.prompts as prompts
+from components.cancellable_chat_generator import CancellableChatGenerator
+from memory.memory import MemoryManager
+from rate_limiter.spend_limiter import SpendAccount, TokenUsage
+from tools import time
+from tools.user_info import make_update_user_info_tool
+from tracing_utils import log_ctx, span
+from utils import resources
+from utils.cancellation import CancellationToken
+from utils.settings import bool_env, positive_int_env
+
+logger = logging.getLogger(__name__)
+
+ROUTER_ENABLED = bool_env("ROUTER_ENABLED", True)
+ROUTER_CLASSIFIER_ENABLED = bool_env("ROUTER_CLASSIFIER_ENABLED", True)
+# Longer messages are almost never small talk; they skip the classifier call.
+ROUTER_CLASSIFY_MAX_WORDS = positive_int_env("ROUTER_CLASSIFY_MAX_WORDS", 12)
+ROUTER_MODEL = "eu.amazon.nova-micro-v1:0"
+SMALL_TALK_MAX_TOKENS = 200
+
+ROUTE_TIME = "time"
+ROUTE_SMALL_TALK = "small_talk"
+ROUTE_FULL = "full"
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    """USD per million tokens."""
+    input: float
+    output: float
+    cache_read: float = 0.0
+    cache_write: float = 0.0
+
+    def cost(self, usage: TokenUsage) -> float:
+        return (
+            usage.input_tokens * self.input
+            + usage.output_tokens * self.output
+            + usage.cache_read_tokens * self.cache_read
+            + usage.cache_write_tokens * self.cache_write
+        ) / 1_000_000
+
+
+MODEL_PRICES = {
+    chat_agent.CHAT_MODEL: ModelPrice(input=3.0, output=15.0, cache_read=0.3, cache_write=3.75),
+    ROUTER_MODEL: ModelPrice(input=0.035, output=0.14),
+}
+
+_GREETING_RE = re.compile(
+    r"^(?:hi+|hello|hey+|hiya|yo|good (?:morning|afternoon|evening)|thanks?(?: you)?|thank you|thx|ty|cheers"
+    r"|bye|goodbye|see (?:you|ya)|take care)"
+    r"(?:[\s,]+(?:so much|a lot|again|there|all|gonçalo|goncalo|man|mate|for (?:the|your) (?:help|time|chat)))*"
+    r"[\s!.,:)]*$",
+    re.IGNORECASE,
+)
+_ACK_RE = re.compile(
+    r"^(?:ok(?:ay)?|cool|great|nice|awesome|perfect|interesting|got it|makes sense|lol|haha+)"
+    r"(?:[\s,]+(?:thanks?|thank you|stuff|one|!))*[\s!.,:)]*$",
+    re.IGNORECASE,
+)
+_INTRO_RE = re.compile(
+    r"\b(?:my name is|my name's|call me|i work (?:at|for)|i'm from|i am from)\b"
+    r"|^(?:(?:hi|hello|hey)[\s,!]+)?(?:i'm|i am|this is)\s+[a-z]+[\s,.!]*(?:from|at|,|$)",
+    re.IGNORECASE,
+)
+# Only wording that asks for the clock: "what time do you start?" is a question for me.
+_TIME_RE = re.compile(r"\b(?:time is it|(?:current|local) time)\b", re.IGNORECASE)
+_PLACE_RE = re.compile(
+    r"\b(?:in|at|for)\s+([a-z][a-z .'-]*?)\s*(?:right now|now|today|currently|at the moment)?[\s?.!]*$",
+    re.IGNORECASE,
+)
+# Asking about me, or anything that starts the meeting flow, needs the full agent.
+_FULL_RE = re.compile(r"\?|\b(?:you|your|yours|meet|meeting|call|schedule|book|calendar|email)\b", re.IGNORECASE)
+_ZONE_ALIASES = {
+    "portugal": "Europe/Lisbon",
+    "uk": "Europe/London",
+    "nyc": "America/New_York",
+    "new york city": "America/New_York",
+    "sf": "America/Los_Angeles",
+    "san francisco": "America/Los_Angeles",
+    "silicon valley": "America/Los_Angeles",
+    "utc": "UTC",
+    "gmt": "UTC",
+}
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    route: str
+    reason: str
+    latency_ms: float = 0.0
+    zone: str | None = None  # the ``time`` route's IANA timezone
+
+
+@dataclass
+class RouteStats:
+    turns: int = 0
+    routing_ms: float = 0.0
+    cost_usd: float = 0.0
+
+
+@dataclass
+class RouterStats:
+    routes: dict[str, RouteStats] = field(default_factory=lambda: {
+        ROUTE_TIME: RouteStats(), ROUTE_SMALL_TALK: RouteStats(), ROUTE_FULL: RouteStats(),
+    })
+    classifier_calls: int = 0
+    classifier_cost_usd: float = 0.0
+
+
+stats = RouterStats()
+_stats_lock = threading.Lock()
+
+
+def chat(
+        session_id: str,
+        message: str,
+        on_stream: Callable[[str], None],
+        cancellation: CancellationToken | None = None,
+        spend: SpendAccount | None = None,
+) -> str:
+    """Run one chat turn on the route chosen for it; same contract as ``chat_agent.chat``.
+
+    Only the full route reserves against ``spend``: time answers are free and a small-talk
+    turn costs around a hundredth of a Sonnet turn.
+    """
+    cancellation = cancellation or CancellationToken()
+    mem = MemoryManager(session_id=session_id)
+    decision = route(message, mem)
+
+    usage = TokenUsage()
+
+    def record(turn_usage: TokenUsage) -> None:
+        nonlocal usage
+        usage = turn_usage
+
+    try:
+        if decision.route == ROUTE_TIME:
+            return _answer_time(mem, message, decision.zone, on_stream, cancellation)
+        if decision.route == ROUTE_SMALL_TALK:
+            return _small_talk(mem, message, on_stream, cancellation, record)
+        return chat_agent.chat(session_id, message, on_stream, cancellation, spend, mem=mem, on_usage=record)
+    finally:
+        model = ROUTER_MODEL if decision.route == ROUTE_SMALL_TALK else chat_agent.CHAT_MODEL
+        cost = MODEL_PRICES[model].cost(usage)
+        with _stats_lock:
+            route_stats = stats.routes[decision.route]
+            route_stats.turns += 1
+            route_stats.routing_ms += decision.latency_ms
+            route_stats.cost_usd += cost
+        logger.info(
+            "Route %s (%s) in %.1fms, turn cost $%.5f; %s",
+            decision.route, decision.reason, decision.latency_ms, cost, stats,
+            **log_ctx(session_id=session_id),
+        )
+
+
+def route(message: str, mem: MemoryManager) -> RouteDecision:
+    started = perf_counter()
+    with span("router.route", session_id=mem.session_id) as s:
+        try:
+            route_name, reason, zone = _route(message, mem)
+        except Exception as e:
+            logger.warning("Routing failed, using the full agent: %s", e)
+            route_name, reason, zone = ROUTE_FULL, "error", None
+        latency_ms = (perf_counter() - started) * 1000
+        s.set_attribute("router.route", route_name)
+        s.set_attribute("router.reason", reason)
+        s.set_attribute("router.latency_ms", latency_ms)
+    return RouteDecision(route=route_name, reason=reason, latency_ms=latency_ms, zone=zone)
+
+
+def _route(message: str, mem: MemoryManager) -> tuple[str, str, str | None]:
+    text = message.strip()
+    if not ROUTER_ENABLED or not text:
+        return ROUTE_FULL, "disabled" if not ROUTER_ENABLED else "empty", None
+
+    words = len(text.split())
+    # The question mark ending "what time is it in Lisbon?" is not a reason for the full agent.
+    if (_TIME_RE.search(text) and words <= ROUTER_CLASSIFY_MAX_WORDS
+            and not _FULL_RE.search(text.rstrip(" ?!."))):
+        zone = _time_zone(text)
+        if zone is not None:
+            return ROUTE_TIME, "time", zone
+
+    if _GREETING_RE.match(text):
+        return ROUTE_SMALL_TALK, "greeting", None
+
+    # A reply to the bot's question ("I'm John, john@acme.com") continues its flow.
+    asked = bool(mem.window) and mem.window[-1].role == "assistant" and mem.window[-1].content.rstrip().endswith("?")
+    if asked:
+        return ROUTE_FULL, "follow-up", None
+    if _FULL_RE.search(text):
+        return ROUTE_FULL, "question", None
+    if _INTRO_RE.search(text) and words <= 2 * ROUTER_CLASSIFY_MAX_WORDS:
+        return ROUTE_SMALL_TALK, "introduction", None
+    if _ACK_RE.match(text):
+        return ROUTE_SMALL_TALK, "acknowledgement", None
+
+    if not ROUTER_CLASSIFIER_ENABLED or words > ROUTER_CLASSIFY_MAX_WORDS:
+        return ROUTE_FULL, "default", None
+    return _classify(text), "classifier", None
+
+
+def _classify(message: str) -> str:
+    reply = _bedrock().run(
+        messages=[ChatMessage.from_system(prompts.ROUTER_PROMPT), ChatMessage.from_user(message)],
+        generation_kwargs={"maxTokens": 5, "temperature": 0.0},
+    )["replies"][-1]
+    cost = MODEL_PRICES[ROUTER_MODEL].cost(TokenUsage.from_replies([reply]))
+    with _stats_lock:
+        stats.classifier_calls += 1
+        stats.classifier_cost_usd += cost
+    label = (reply.text or "").strip().lower()
+    return ROUTE_SMALL_TALK if label.startswith("small") else ROUTE_FULL
+
+
+@functools.lru_cache(maxsize=1)
+def _zones_by_place() -> dict[str, str]:
+    zones = {}
+    for zone in sorted(zoneinfo.available_timezones()):
+        if "/" in zone and not zone.startswith(("Etc/", "SystemV/", "US/")):
+            zones.setdefault(zone.rsplit("/", 1)[1].replace("_", " ").lower(), zone)
+    zones.update(_ZONE_ALIASES)
+    return zones
+
+
+def _time_zone(message: str) -> str | None:
+    match = _PLACE_RE.search(message)
+    if match is None:
+        return None
+    place = match.group(1).strip(" .'-").lower()
+    return _zones_by_place().get(place.removeprefix("the "))
+
+
+def _answer_time(
+        mem: MemoryManager, message: str, zone: str, on_stream: Callable[[str], None], cancellation: CancellationToken
+) -> str:
+    now = datetime.fromisoformat(time.get_current_time.invoke(timezone_name=zone).replace("Z", "+00:00"))
+    place = zone.rsplit("/", 1)[-1].replace("_", " ")
+    answer = f"Right now it's {now:%H:%M} on {now:%A} in {place}."
+    on_stream(answer)
+    cancellation.raise_if_cancelled()
+    mem.save_turn(user_msg=message, assistant_msg=answer)
+    return answer
+
+
+def _small_talk(
+        mem: MemoryManager,
+        message: str,
+        on_stream: Callable[[str], None],
+        cancellation: CancellationToken,
+        on_usage: Callable[[TokenUsage], None],
+) -> str:
+    messages = [ChatMessage.from_system(prompts.SMALL_TALK_PROMPT)]
+    messages += prompts.window_messages(mem.get_memory())
+    messages.append(ChatMessage.from_user(message))
+
+    agent = Agent(
+        chat_generator=CancellableChatGenerator(_small_talk_generator(), cancellation),
+        tools=[make_update_user_info_tool(mem)],
+    )
+    try:
+        result = agent.run(
+            messages=messages,
+            streaming_callback=lambda chunk: on_stream(chunk.content) if chunk.content else None,
+        )
+    except Exception:
+        cancellation.raise_if_cancelled()
+        raise
+    on_usage(TokenUsage.from_replies(result["messages"]))
+
+    cancellation.raise_if_cancelled()
+    answer = result["messages"][-1].text
+    mem.save_turn(user_msg=message, assistant_msg=answer)
+    return answer
+
+
+def _bedrock() -> AmazonBedrockChatGenerator:
+    # Same registry key as the summary compaction, so the two share one client.
+    return resources.get_or_create(
+        ("bedrock", ROUTER_MODEL),
+        lambda: AmazonBedrockChatGenerator(model=ROUTER_MODEL),
+    )
+
+
+def _small_talk_generator() -> AmazonBedrockChatGenerator:
+    # The Agent does not forward per-run generation kwargs, so the cap lives on the generator.
+    return resources.get_or_create(
+        ("bedrock", ROUTER_MODEL, "small_talk"),
+        lambda: AmazonBedrockChatGenerator(
+            model=ROUTER_MODEL,
+            generation_kwargs={"maxTokens": SMALL_TALK_MAX_TOKENS},
+        ),
+    )
@@ -1,23 +1,44 @@
 import json
 import logging
-from queue import SimpleQueue
+import time
+from dataclasses import dataclass
+from queue import Empty, SimpleQueue
 from threading import Thread
+from time import perf_counter
 from typing import TypedDict
 
-from utils import error_messages
+from memory.conversation_store import ConversationStore
+from metrics import flushing, metrics
+from utils import error_messages, resources
+from utils.cancellation import CancellationToken, TurnCancelled
+from utils.settings import bool_env, non_negative_int_env, positive_int_env
 from services import notifications
 from tracing import init_tracing, tracer
+from tracing_utils import span
+from rate_limiter.leased_bucket import LeaseConfig, LeasedTokenBucket
+from rate_limiter.spend_limiter import SpendLimiter, SpendLimitExceeded
 from rate_limiter.token_bucket import TokenBucket, TokenBucketConfig
 
-import boto3
-
-from agents.chat_agent import chat
+from agents.router import chat
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 init_tracing("chat_handler")
 
-_RATE_LIMITER = TokenBucket(TokenBucketConfig(4, 6))
+_RATE_LIMITER = LeasedTokenBucket(
+    TokenBucket(TokenBucketConfig(4, 6)),
+    LeaseConfig(
+        lease_size=positive_int_env("RATE_LIMIT_LEASE_SIZE", 3),
+        lease_seconds=positive_int_env("RATE_LIMIT_LEASE_SECONDS", 30),
+        max_overshoot=non_negative_int_env("RATE_LIMIT_MAX_OVERSHOOT", 1),
+    ),
+)
+_SPEND_LIMITER = SpendLimiter()
+
+
+STREAM_COALESCE = bool_env("STREAM_COALESCE", True)
+STREAM_MAX_FRAME_CHARS = positive_int_env("STREAM_MAX_FRAME_CHARS", 512)
+STREAM_FLUSH_MS = positive_int_env("STREAM_FLUSH_MS", 40)
 
 
 class _Operation(TypedDict):
@@ -25,44 +46,120 @@ class _Operation(TypedDict):
     payload: str | None
 
 
+@dataclass
+class CoalesceConfig:
+    """Limits for merging queued chunks into one WebSocket frame."""
+    enabled: bool = STREAM_COALESCE
+    max_frame_chars: int = STREAM_MAX_FRAME_CHARS
+    flush_window_ms: int = STREAM_FLUSH_MS
+
+
+@dataclass
+class MessengerStats:
+    frames_sent: int = 0
+    chunks_received: int = 0
+    chunks_merged: int = 0
+    first_frame_ms: float | None = None  # since the messenger was created, i.e. the turn began
+
+
 class OutboundMessenger:
-    def __init__(self, endpoint_url: str, connection_id: str) -> None:
+    def __init__(
+            self,
+            endpoint_url: str,
+            connection_id: str,
+            coalesce: CoalesceConfig | None = None,
+            cancellation: CancellationToken | None = None,
+    ) -> None:
         self.operations = SimpleQueue[_Operation]()
         self.endpoint_url = endpoint_url
         self.connection_id = connection_id
+        self.coalesce = coalesce or CoalesceConfig()
+        self.cancellation = cancellation or CancellationToken()
+        self.stats = MessengerStats()
+        self.started = perf_counter()
 
     def run(self) -> None:
-        apigw_client = boto3.client("apigatewaymanagementapi", endpoint_url=self.endpoint_url)
+        apigw_client = resources.boto3_client("apigatewaymanagementapi", endpoint_url=self.endpoint_url)
 
+        try:
+            self._drain(apigw_client)
+        except apigw_client.exceptions.GoneException:
+            logger.info("Connection %s is gone, cancelling turn", self.connection_id)
+            self.cancellation.cancel("connection gone")
+
+        logger.info(
+            "Messenger frames_sent=%d chunks_received=%d chunks_merged=%d",
+            self.stats.frames_sent,
+            self.stats.chunks_received,
+            self.stats.chunks_merged,
+        )
+
+    def _drain(self, apigw_client) -> None:
+        pending: _Operation | None = None
         while True:
-            operation = self.operations.get()
+            operation = pending or self.operations.get()
+            pending = None
 
             if operation["type"] == "message":
-                apigw_client.post_to_connection(
-                    ConnectionId=self.connection_id,
-                    Data=json.dumps({
-                        "op": "message_chunk",
-                        "content": operation["payload"],
-                    }),
-                )
+                self.stats.chunks_received += 1
+                content = operation["payload"]
+                # The first frame goes out as soon as it arrives so time-to-first-token is unaffected.
+                if self.coalesce.enabled and self.stats.frames_sent > 0:
+                    content, pending = self._coalesce(content)
+                self._post(apigw_client, {
+                    "op": "message_chunk",
+                    "content": content,
+                })
+                if self.stats.first_frame_ms is None:
+                    self.stats.first_frame_ms = (perf_counter() - self.started) * 1000
             elif operation["type"] == "finish":
-                apigw_client.post_to_connection(
-                    ConnectionId=self.connection_id,
-                    Data=json.dumps({
-                        "op": "finish",
-                    }),
-                )
+                self._post(apigw_client, {
+                    "op": "finish",
+                })
                 break
             elif operation["type"] == "error":
-                apigw_client.post_to_connection(
-                    ConnectionId=self.connection_id,
-                    Data=json.dumps({
-                        "op": "error",
-                        "message": operation["payload"],
-                    }),
-                )
+                self._post(apigw_client, {
+                    "op": "error",
+                    "message": operation["payload"],
+                })
                 break
 
+    def _coalesce(self, content: str) -> tuple[str, _Operation | None]:
+        """Merge queued message chunks until the frame is full or the flush window closes.
+
+        Returns the merged content and, if one was dequeued, the next non-message operation.
+        """
+        parts = [content]
+        size = len(content)
+        deadline = time.monotonic() + self.coalesce.flush_window_ms / 1000
+        pending: _Operation | None = None
+
+        while size < self.coalesce.max_frame_chars:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                operation = self.operations.get(timeout=remaining)
+            except Empty:
+                break
+            if operation["type"] != "message":
+                pending = operation
+                break
+            parts.append(operation["payload"])
+            size += len(operation["payload"])
+
+        merged = len(parts) - 1
+        self.stats.chunks_received += merged
+        self.stats.chunks_merged += merged
+        return "".join(parts), pending
+
+    def _post(self, apigw_client, data: dict) -> None:
+        apigw_client.post_to_connection(
+            ConnectionId=self.connection_id,
+            Data=json.dumps(data),
+        )
+        self.stats.frames_sent += 1
+
     def error(self, payload: str | None) -> None:
         self.operations.put(_Operation(
             type="error",
@@ -79,8 +176,9 @@ class OutboundMessenger:
         self.operations.put(_Operation(type="finish", payload=None))
 
 
+@flushing
 def handler(event, context):
-    with tracer.start_as_current_span("handler"):
+    with tracer.start_as_current_span("handler") as handler_span:
         logger.info("Received event: " + json.dumps(event, indent=2))
 
         route_key = event["requestContext"]["routeKey"]
@@ -103,6 +201,10 @@ def handler(event, context):
             return {"statusCode": 200, "body": "Connected"}
         elif route_key == "$disconnect":
             connection_id = event["requestContext"]["connectionId"]
+            try:
+                ConversationStore(connection_id).mark_disconnected()
+            except Exception as e:
+                logger.warning("Failed to mark connection as disconnected: %s", e)
             try:
                 notifications.send_conversation_end_event(connection_id)
             except Exception as e:
@@ -115,7 +217,8 @@ def handler(event, context):
 
         endpoint_url = f"https://{domain_name}"
 
-        outbound_messenger = OutboundMessenger(endpoint_url, connection_id)
+        cancellation = CancellationToken(probe=ConversationStore(connection_id).is_disconnected)
+        outbound_messenger = OutboundMessenger(endpoint_url, connection_id, cancellation=cancellation)
 
         raw_body = event.get("body", "") or "{}"
         try:
@@ -132,15 +235,30 @@ def handler(event, context):
         messenger_thread.start()
 
         try:
-            if _RATE_LIMITER.should_throttle(ip or connection_id):
+            with span("chat.rate_limit", session_id=connection_id):
+                throttled = _RATE_LIMITER.should_throttle(ip or connection_id)
+            if throttled:
                 outbound_messenger.error(error_messages.get_rate_limit_message())
                 logger.info("Rate limit exceeded for %s", ip)
                 return {"statusCode": 429, "body": "Rate limit exceeded"}
 
             logger.info("chat: %s", message_text)
-            chat(connection_id, message_text, on_stream=lambda chunk: outbound_messenger.message(payload=chunk))
+            chat(
+                connection_id,
+                message_text,
+                on_stream=lambda chunk: outbound_messenger.message(payload=chunk),
+                cancellation=cancellation,
+                spend=_SPEND_LIMITER.account(f"session#{connection_id}", f"ip#{ip}" if ip else None),
+            )
 
             return {"statusCode": 200}
+        except SpendLimitExceeded as e:
+            outbound_messenger.error(error_messages.get_rate_limit_message())
+            logger.info("Spend limit exceeded for %s: %s", ip or connection_id, e)
+            return {"statusCode": 429, "body": "Spend limit exceeded"}
+        except TurnCancelled as e:
+            logger.info("Turn cancelled for %s: %s", connection_id, e)
+            return {"statusCode": 410, "body": "Connection gone"}
         except Exception as e:
             logger.exception("Unexpected exception: %s", e)
             outbound_messenger.error(error_messages.get_generic_error_message())
@@ -156,3 +274,18 @@ def handler(event, context):
         finally:
             outbound_messenger.finish()
             messenger_thread.join(timeout=60)
+            _record_turn(outbound_messenger, handler_span)
+
+
+def _record_turn(messenger: OutboundMessenger, handler_span) -> None:
+    """Turn latency (until the last frame was posted) and time to first token as seen by the client."""
+    stats = messenger.stats
+    metrics.put("TurnLatency", (perf_counter() - messenger.started) * 1000)
+    if stats.first_frame_ms is not None:
+        metrics.put("TimeToFirstToken", stats.first_frame_ms)
+        handler_span.set_attribute("chat.ttft_ms", stats.first_frame_ms)
+    metrics.put("StreamFrames", stats.frames_sent, unit="Count")
+    metrics.put("StreamChunks", stats.chunks_received, unit="Count")
+    handler_span.set_attribute("stream.frames", stats.frames_sent)
+    handler_span.set_attribute("stream.chunks", stats.chunks_received)
+    handler_span.set_attribute("stream.chunks_merged", stats.chunks_merged)
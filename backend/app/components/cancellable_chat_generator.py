@@ -0,0 +1,105 @@
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+from haystack import component
+from haystack.dataclasses import ChatMessage
+
+from metrics import metrics
+from rate_limiter.spend_limiter import TokenUsage
+from tracing_utils import span
+from utils.cancellation import CancellationToken
+
+
+@component
+class CancellableChatGenerator:
+    """Wraps a chat generator so the Agent loop stops once the turn is cancelled.
+
+    The shared registry is probed before every model call. Streamed chunks only check the
+    in-process signal (set by the messenger on ``GoneException``) so token delivery never
+    waits on I/O.
+
+    Streamed Anthropic replies only carry the usage of the final ``message_delta`` event,
+    in Anthropic's field names; input and cache counts arrive on ``message_start``. Both
+    are merged into the reply's ``usage`` meta in the same shape as non-streamed replies.
+
+    Each call gets an ``llm.generate`` span (time to first token, chunk and token counts)
+    and a ``DependencyLatency`` sample under the model's name. ``usage`` sums every call's
+    reported usage, including what a failed or cancelled stream reported before stopping,
+    so a turn that errors can still be charged for what it used.
+    """
+
+    def __init__(self, chat_generator: Any, cancellation: CancellationToken) -> None:
+        self.chat_generator = chat_generator
+        self.cancellation = cancellation
+        self.usage = TokenUsage()
+
+    @component.output_types(replies=List[ChatMessage])
+    def run(
+            self,
+            messages: List[ChatMessage],
+            streaming_callback: Optional[Any] = None,
+            generation_kwargs: Optional[Dict[str, Any]] = None,
+            tools: Optional[Any] = None,
+    ) -> dict:
+        self.cancellation.raise_if_cancelled()
+        usage: Dict[str, Any] = {}
+        model = getattr(self.chat_generator, "model", type(self.chat_generator).__name__)
+        started = perf_counter()
+        chunks = 0
+        first_token_ms = None
+
+        def on_chunk(chunk):
+            nonlocal chunks, first_token_ms
+            self.cancellation.raise_if_set()
+            _collect_usage(chunk.meta, usage)
+            chunks += 1
+            if first_token_ms is None and chunk.content:
+                first_token_ms = (perf_counter() - started) * 1000
+            if streaming_callback is not None:
+                streaming_callback(chunk)
+
+        with span("llm.generate", model=model, messages=len(messages)) as s:
+            with metrics.timer("DependencyLatency", Dependency=f"llm.{model}"):
+                try:
+                    result = self.chat_generator.run(
+                        messages=messages,
+                        streaming_callback=on_chunk,
+                        generation_kwargs=generation_kwargs,
+                        tools=tools,
+                    )
+                except Exception:
+                    self.usage += TokenUsage.from_meta(_openai_usage(usage))
+                    raise
+            if usage:
+                for reply in result["replies"]:
+                    reply.meta["usage"] = _openai_usage(usage)
+            self.usage += TokenUsage.from_replies(result["replies"])
+
+            s.set_attribute("llm.chunks", chunks)
+            if first_token_ms is not None:
+                s.set_attribute("llm.ttft_ms", first_token_ms)
+            for reply in result["replies"]:
+                s.set_attribute("llm.tool_calls", len(reply.tool_calls))
+                for key, value in (reply.meta.get("usage") or {}).items():
+                    if isinstance(value, int):
+                        s.set_attribute(f"llm.usage.{key}", value)
+        return result
+
+
+def _collect_usage(meta: Dict[str, Any], usage: Dict[str, Any]) -> None:
+    if meta.get("type") == "message_start":
+        reported = (meta.get("message") or {}).get("usage")
+    elif meta.get("type") == "message_delta":
+        reported = meta.get("usage")  # cumulative counts, so later values win
+    else:
+        return
+    usage.update({k: v for k, v in (reported or {}).items() if v is not None})
+
+
+def _openai_usage(usage: Dict[str, Any]) -> Dict[str, Any]:
+    usage = dict(usage)
+    if "input_tokens" in usage:
+        usage["prompt_tokens"] = usage.pop("input_tokens")
+    if "output_tokens" in usage:
+        usage["completion_tokens"] = usage.pop("output_tokens")
+    return usage
@@ -0,0 +1,27 @@
+import logging
+
+from haystack import component
+
+from knowledge import context_packer, rag
+from tracing_utils import log_ctx, span
+
+logger = logging.getLogger(__name__)
+
+
+@component
+class ContextPacker:
+
+    @component.output_types(documents=str)
+    def run(self, session_id: str, search_query: str, results: list) -> dict:
+        with span("rag.pack_context", session_id=session_id) as s:
+            packed = context_packer.pack(results, search_query)
+            s.set_attribute("context.tokens_in", packed.tokens_in)
+            s.set_attribute("context.tokens_out", packed.tokens_out)
+            s.set_attribute("context.tokens_saved", packed.tokens_saved)
+        logger.info(
+            "Packed %d/%d docs, %d -> %d tokens (saved %d; dropped %d low-score, %d duplicates)",
+            len(packed.results), len(results), packed.tokens_in, packed.tokens_out, packed.tokens_saved,
+            packed.dropped_low_score, packed.dropped_duplicates,
+            **log_ctx(session_id=session_id),
+        )
+        return {"documents": rag.format_results(packed.results)}
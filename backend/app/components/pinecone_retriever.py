@@ -1,8 +1,10 @@
 import logging
+from typing import Optional
 
 from haystack import component
 
 from knowledge import rag
+from knowledge.prefetch import Prefetch
 from tracing_utils import log_ctx
 
 logger = logging.getLogger(__name__)
@@ -11,8 +13,12 @@ logger = logging.getLogger(__name__)
 @component
 class PineconeRetriever:
 
-    @component.output_types(documents=[str])
-    def run(self, session_id: str, search_query: str, top_k: int, top_n: int) -> dict:
-        results = rag.search(search_query, top_k, top_n)
+    @component.output_types(results=list)
+    def run(
+            self, session_id: str, search_query: str, top_k: int, top_n: int, prefetch: Optional[Prefetch] = None
+    ) -> dict:
+        results = prefetch.take(search_query, top_k, top_n) if prefetch is not None else None
+        if results is None:
+            results = rag.search(search_query, top_k, top_n)
         logger.info("RAG hits: %s", len(results), **log_ctx(session_id=session_id))
-        return {"documents": rag.format_results(results)}
+        return {"results": results}
@@ -9,8 +9,10 @@ from haystack_integrations.components.generators.amazon_bedrock import (
 )
 
 from memory.conversation_store import ConversationStore
+from metrics import flushing
 from services import email
 from tracing import init_tracing, tracer
+from utils import resources
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -71,8 +73,9 @@ def _build_prompt(text_block: str) -> str:
 
 
 def _run_bedrock(prompt: str) -> str:
-    generator = AmazonBedrockChatGenerator(
-        model=MODEL_ID,
+    generator = resources.get_or_create(
+        ("bedrock", MODEL_ID),
+        lambda: AmazonBedrockChatGenerator(model=MODEL_ID),
     )
     result = generator.run(messages=[ChatMessage.from_user(prompt)])
     replies: List[ChatMessage] = result.get("replies", [])
@@ -133,6 +136,7 @@ def _get_env_var(name: str) -> str:
     return val
 
 
+@flushing
 def handler(event, context):
     """Generate a conversation summary and send via email."""
     with tracer.start_as_current_span("handler"):
@@ -0,0 +1,123 @@
+"""Okapi BM25 inverted index over the knowledge records, built at ingest and shipped as JSON.
+
+Used as a first-stage lexical retriever next to dense search: exact entity and
+technology terms ("Terraform", "Kafka", company names) are matched locally, and a query
+fully covered by one record can be answered without a Pinecone call.
+"""
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+BM25_INDEX_PATH = os.environ.get("BM25_INDEX_PATH", os.path.join(os.path.dirname(__file__), "bm25_index.json"))
+
+_TOKEN_RE = re.compile(r"[\w][\w+#.-]*[\w+#]|\w", re.UNICODE)
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can did do does for from had has have how i if in into is it its "
+    "me my of on or our so that the their them then there these they this to was we were what when "
+    "where which who why will with you your about tell".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in _STOPWORDS]
+
+
+@dataclass
+class BM25Index:
+    ids: List[str]
+    texts: List[str]
+    doc_lengths: List[int]
+    postings: Dict[str, List[Tuple[int, int]]]  # term -> [(doc, term frequency)]
+    k1: float = 1.2
+    b: float = 0.75
+    avg_length: float = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+
+    @classmethod
+    def build(cls, records: Sequence[dict]) -> "BM25Index":
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        lengths = []
+        for doc, record in enumerate(records):
+            terms = tokenize(record["text"])
+            lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                postings[term].append((doc, tf))
+        return cls(
+            ids=[r["id"] for r in records],
+            texts=[r["text"] for r in records],
+            doc_lengths=lengths,
+            postings=dict(postings),
+        )
+
+    @classmethod
+    def load(cls, path: str = BM25_INDEX_PATH) -> "BM25Index":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(
+            ids=data["ids"],
+            texts=data["texts"],
+            doc_lengths=data["doc_lengths"],
+            postings={t: [tuple(p) for p in ps] for t, ps in data["postings"].items()},
+        )
+        logger.info("Loaded BM25 index %s: %d records, %d terms", path, len(index.ids), len(index.postings))
+        return index
+
+    def save(self, path: str = BM25_INDEX_PATH) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "ids": self.ids,
+                "texts": self.texts,
+                "doc_lengths": self.doc_lengths,
+                "postings": self.postings,
+            }, f, ensure_ascii=False, separators=(",", ":"))
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        n = len(self.ids)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """Return ``(doc, score)`` pairs for the best ``top_k`` records, best first."""
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for doc, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc] / (self.avg_length or 1))
+                scores[doc] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+
+    def coverage(self, query: str, doc: int) -> float:
+        """IDF-weighted share of the query's terms that occur in ``doc`` (unknown terms count fully)."""
+        terms = set(tokenize(query))
+        if not terms:
+            return 0.0
+        max_idf = self.idf("")
+        total = matched = 0.0
+        for term in terms:
+            postings = self.postings.get(term)
+            weight = self.idf(term) if postings else max_idf
+            total += weight
+            if postings and any(d == doc for d, _ in postings):
+                matched += weight
+        return matched / total
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: each id scores ``sum(1 / (k + rank))`` over the lists it appears in."""
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
@@ -0,0 +1,97 @@
+"""Split Notion page markdown into passage-sized records for the vector index.
+
+Pages are split at headings first, then long sections are cut into overlapping token
+windows. Chunk ids are ``<page_id>#<n>`` with ``n`` counting from 0 in page order, so a
+re-ingest overwrites the same ids and anything past the new last chunk is stale.
+"""
+import re
+from typing import List
+
+from memory.tokens import count_tokens
+from utils.settings import positive_int_env
+
+CHUNK_TOKENS = positive_int_env("CHUNK_TOKENS", 300)
+CHUNK_OVERLAP_TOKENS = positive_int_env("CHUNK_OVERLAP_TOKENS", 50)
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*\S)\s*$")
+
+
+def chunk_id(page_id: str, n: int) -> str:
+    return f"{page_id}#{n}"
+
+
+def chunk_page(
+        page_id: str,
+        title: str,
+        markdown: str,
+        max_tokens: int = CHUNK_TOKENS,
+        overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> List[dict]:
+    """Return upsert-ready records with ``id``, ``text`` and ``page_id``/``title``/``section`` metadata.
+
+    Each chunk's text starts with the page title and section so it embeds with its context.
+    """
+    records = []
+    for section, body in _sections(markdown):
+        for window in _windows(body, max_tokens, overlap_tokens):
+            heading = f"{title} › {section}" if section else title
+            records.append({
+                "id": chunk_id(page_id, len(records)),
+                "page_id": page_id,
+                "title": title,
+                "section": section,
+                "chunk": len(records),
+                "text": f"{heading}\n\n{window}",
+            })
+    return records
+
+
+def _sections(markdown: str) -> List[tuple]:
+    """Split at headings into ``(heading path, body)`` pairs, dropping empty bodies."""
+    sections = []
+    path: List[tuple] = []  # (level, heading)
+    lines: List[str] = []
+
+    def flush():
+        body = "\n".join(lines).strip()
+        if body:
+            sections.append((" › ".join(h for _, h in path), body))
+        lines.clear()
+
+    for line in markdown.splitlines():
+        match = _HEADING_RE.match(line)
+        if not match:
+            lines.append(line)
+            continue
+        flush()
+        level = len(match.group(1))
+        path = [p for p in path if p[0] < level] + [(level, match.group(2))]
+    flush()
+    return sections
+
+
+def _windows(text: str, max_tokens: int, overlap_tokens: int) -> List[str]:
+    if count_tokens(text) <= max_tokens:
+        return [text]
+
+    # Keep line breaks (lists, code) by windowing over whitespace-delimited pieces.
+    pieces = re.findall(r"\S+\s*", text)
+    costs = [count_tokens(p) for p in pieces]
+    windows = []
+    start = 0
+    while start < len(pieces):
+        end, used = start, 0
+        while end < len(pieces) and (used + costs[end] <= max_tokens or end == start):
+            used += costs[end]
+            end += 1
+        windows.append("".join(pieces[start:end]).strip())
+        if end >= len(pieces):
+            break
+
+        # Step back far enough to repeat ``overlap_tokens`` of context, always moving forward.
+        back, carried = end, 0
+        while back > start + 1 and carried + costs[back - 1] <= overlap_tokens:
+            back -= 1
+            carried += costs[back]
+        start = back
+    return windows
@@ -0,0 +1,119 @@
+"""Fit retrieval results into a token budget before they are handed to the model.
+
+Results come in rank order. Weak results (below a fraction of the best score) and near
+duplicates of an already packed passage are dropped. Each remaining doc is trimmed to its
+paragraphs that best match the query, and docs are packed until the budget is spent.
+Thresholds are relative because the score scale depends on the retriever (reranker,
+BM25 or reciprocal rank fusion).
+"""
+import re
+from dataclasses import dataclass, field
+from typing import List, Set
+
+from knowledge.bm25 import tokenize
+from knowledge.vector_store import SearchResult
+from memory.tokens import count_tokens
+from utils.settings import positive_float_env, positive_int_env
+
+CONTEXT_TOKEN_BUDGET = positive_int_env("CONTEXT_TOKEN_BUDGET", 1_500)
+CONTEXT_MAX_DOC_TOKENS = positive_int_env("CONTEXT_MAX_DOC_TOKENS", 400)
+CONTEXT_MIN_RELATIVE_SCORE = positive_float_env("CONTEXT_MIN_RELATIVE_SCORE", 0.25)
+CONTEXT_DUPLICATE_SIMILARITY = positive_float_env("CONTEXT_DUPLICATE_SIMILARITY", 0.8)
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n|\n(?=#)")
+_MIN_PACKED_TOKENS = 40  # not worth adding a doc that would be cut shorter than this
+
+
+@dataclass
+class PackerConfig:
+    token_budget: int = CONTEXT_TOKEN_BUDGET
+    max_doc_tokens: int = CONTEXT_MAX_DOC_TOKENS
+    min_relative_score: float = CONTEXT_MIN_RELATIVE_SCORE
+    duplicate_similarity: float = CONTEXT_DUPLICATE_SIMILARITY
+
+
+@dataclass
+class PackedContext:
+    results: List[SearchResult] = field(default_factory=list)
+    tokens_in: int = 0
+    tokens_out: int = 0
+    dropped_low_score: int = 0
+    dropped_duplicates: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_in - self.tokens_out
+
+
+def pack(results: List[SearchResult], query: str, config: PackerConfig = PackerConfig()) -> PackedContext:
+    packed = PackedContext(tokens_in=sum(count_tokens(r["text"]) for r in results))
+    if not results:
+        return packed
+
+    best = max(r["score"] for r in results)
+    query_terms = set(tokenize(query))
+    seen_shingles: List[Set[str]] = []
+    remaining = config.token_budget
+
+    for r in results:
+        if best > 0 and r["score"] < best * config.min_relative_score:
+            packed.dropped_low_score += 1
+            continue
+
+        shingles = _shingles(r["text"])
+        if any(_jaccard(shingles, s) >= config.duplicate_similarity for s in seen_shingles):
+            packed.dropped_duplicates += 1
+            continue
+
+        limit = min(config.max_doc_tokens, remaining)
+        if limit < _MIN_PACKED_TOKENS:
+            break
+        text = _trim(r["text"], query_terms, limit)
+        tokens = count_tokens(text)
+
+        seen_shingles.append(shingles)
+        packed.results.append(SearchResult(id=r["id"], text=text, score=r["score"]))
+        packed.tokens_out += tokens
+        remaining -= tokens
+
+    return packed
+
+
+def _trim(text: str, query_terms: Set[str], max_tokens: int) -> str:
+    """Keep the paragraphs that share most terms with the query, in document order, within ``max_tokens``."""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    paragraphs = [p.strip() for p in _PARAGRAPH_RE.split(text) if p.strip()]
+    ranked = sorted(
+        range(len(paragraphs)),
+        key=lambda i: (-len(query_terms.intersection(tokenize(paragraphs[i]))), i),
+    )
+    keep, used = set(), 0
+    for i in ranked:
+        tokens = count_tokens(paragraphs[i])
+        if used + tokens > max_tokens:
+            continue
+        keep.add(i)
+        used += tokens
+
+    if not keep:
+        # One paragraph longer than the limit: cut the best one by words.
+        words = paragraphs[ranked[0]].split()
+        while words and count_tokens(" ".join(words)) > max_tokens:
+            words = words[: int(len(words) * 0.8)]
+        return " ".join(words)
+    return "\n\n".join(paragraphs[i] for i in sorted(keep))
+
+
+def _shingles(text: str, size: int = 3) -> Set[str]:
+    words = tokenize(text)
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
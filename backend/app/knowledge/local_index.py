@@ -0,0 +1,154 @@
+"""Embedded exact-search vector index, selectable with ``VECTOR_BACKEND=local``.
+
+A snapshot is a directory holding L2-normalised float32 embeddings (``embeddings.npy``,
+memory-mapped on load), the record texts as one UTF-8 blob with byte offsets, and the
+record ids. Search is a blocked matrix product, so it is exact cosine similarity and
+needs no network once the query is embedded.
+
+Texts and queries must be embedded with the same model; by default that is the model
+the Pinecone index uses, called through Pinecone's inference API. Pass a precomputed
+``query_embedding`` or register another ``Embedder`` with ``set_query_embedder`` to
+keep query time fully local.
+"""
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Protocol, Sequence, Tuple
+
+import numpy as np
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+LOCAL_INDEX_PATH = os.environ.get(
+    "LOCAL_INDEX_PATH", os.path.join(os.path.dirname(__file__), "index_snapshot")
+)
+EMBEDDING_MODEL = "llama-text-embed-v2"
+SEARCH_BLOCK_ROWS = 8192
+
+
+class Embedder(Protocol):
+    def embed(self, texts: Sequence[str], input_type: str) -> np.ndarray:
+        """Return one row per text; ``input_type`` is ``"query"`` or ``"passage"``."""
+        ...
+
+
+class PineconeEmbedder:
+    """``llama-text-embed-v2`` through Pinecone inference, the model the hosted index uses."""
+
+    def __init__(self, model: str = EMBEDDING_MODEL, batch_size: int = 96) -> None:
+        self.model = model
+        self.batch_size = batch_size
+
+    def embed(self, texts: Sequence[str], input_type: str) -> np.ndarray:
+        from knowledge.vector_store import pinecone_client
+
+        rows = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = list(texts[start:start + self.batch_size])
+            with metrics.timer("DependencyLatency", Dependency="pinecone.embed"):
+                response = pinecone_client().inference.embed(
+                    model=self.model,
+                    inputs=batch,
+                    parameters={"input_type": input_type, "truncate": "END"},
+                )
+            rows.extend(e.values for e in response)
+        return np.asarray(rows, dtype=np.float32)
+
+
+@dataclass
+class LocalIndex:
+    ids: List[str]
+    embeddings: np.ndarray  # (n, dim) float32, rows L2-normalised
+    texts: bytes
+    offsets: np.ndarray  # (n + 1,) int64 byte offsets into ``texts``
+    model: str = EMBEDDING_MODEL
+
+    @classmethod
+    def build(cls, records: Sequence[dict], embeddings: np.ndarray, model: str = EMBEDDING_MODEL) -> "LocalIndex":
+        encoded = [r["text"].encode("utf-8") for r in records]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(t) for t in encoded], out=offsets[1:])
+        return cls(
+            ids=[r["id"] for r in records],
+            embeddings=_normalise(np.asarray(embeddings, dtype=np.float32)),
+            texts=b"".join(encoded),
+            offsets=offsets,
+            model=model,
+        )
+
+    @classmethod
+    def load(cls, path: str = LOCAL_INDEX_PATH) -> "LocalIndex":
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(path, "texts.bin"), "rb") as f:
+            texts = f.read()
+        index = cls(
+            ids=meta["ids"],
+            embeddings=np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r"),
+            texts=texts,
+            offsets=np.load(os.path.join(path, "offsets.npy")),
+            model=meta["model"],
+        )
+        logger.info("Loaded local index %s: %d records, dim %d", path, len(index), index.dim)
+        return index
+
+    def save(self, path: str = LOCAL_INDEX_PATH) -> None:
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "embeddings.npy"), np.ascontiguousarray(self.embeddings, dtype=np.float32))
+        np.save(os.path.join(path, "offsets.npy"), self.offsets)
+        with open(os.path.join(path, "texts.bin"), "wb") as f:
+            f.write(self.texts)
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"model": self.model, "dim": self.dim, "ids": self.ids}, f)
+        logger.info("Saved local index %s: %d records", path, len(self))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return int(self.embeddings.shape[1]) if len(self.embeddings.shape) == 2 else 0
+
+    def text(self, i: int) -> str:
+        return self.texts[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+
+    def search(self, queries: np.ndarray, top_k: int) -> List[List[Tuple[int, float]]]:
+        """Exact cosine top-k for a batch of query embeddings, shape ``(q, dim)`` or ``(dim,)``."""
+        queries = _normalise(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        n = len(self)
+        k = min(top_k, n)
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, n, SEARCH_BLOCK_ROWS):
+            block = self.embeddings[start:start + SEARCH_BLOCK_ROWS]
+            scores = np.concatenate([best_scores, queries @ block.T], axis=1)
+            rows = np.concatenate(
+                [best_rows, np.broadcast_to(np.arange(start, start + len(block)), (len(queries), len(block)))], axis=1
+            )
+            keep = np.argpartition(-scores, k - 1, axis=1)[:, :k] if scores.shape[1] > k else np.argsort(-scores, axis=1)
+            best_scores = np.take_along_axis(scores, keep, axis=1)
+            best_rows = np.take_along_axis(rows, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return [list(zip(r.tolist(), s.tolist())) for r, s in zip(best_rows, best_scores)]
+
+
+def _normalise(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def build_snapshot(records: Sequence[dict], path: str = LOCAL_INDEX_PATH, embedder: Optional[Embedder] = None) -> LocalIndex:
+    """Embed ``records`` (``id``/``text`` dicts) as passages and save them as a snapshot."""
+    embedder = embedder or PineconeEmbedder()
+    index = LocalIndex.build(records, embedder.embed([r["text"] for r in records], "passage"))
+    index.save(path)
+    return index
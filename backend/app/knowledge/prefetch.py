@@ -0,0 +1,127 @@
+"""Speculative retrieval started when a turn begins, before the model asks for it.
+
+Most questions end with the model calling ``search_docs`` after a full round trip spent
+deciding to. ``start`` runs ``rag.search`` on the user's message in the background, in
+parallel with that first model call; when the tool's query is close enough to the
+message, the retriever takes the prefetched results instead of searching again.
+
+Similarity is the overlap coefficient of the two queries' content terms, ignoring the
+persona's name and greetings. Hits, misses (the tool searched for something else) and
+wasted prefetches (never taken) are counted per container and logged every turn, to tune
+``PREFETCH_MIN_OVERLAP`` or turn the feature off.
+"""
+import contextvars
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Set
+
+from knowledge import rag
+from knowledge.bm25 import tokenize
+from knowledge.vector_store import SearchResult
+from utils import resources
+from utils.settings import bool_env, positive_float_env, positive_int_env
+
+logger = logging.getLogger(__name__)
+
+RAG_PREFETCH_ENABLED = bool_env("RAG_PREFETCH_ENABLED", True)
+PREFETCH_MIN_OVERLAP = positive_float_env("PREFETCH_MIN_OVERLAP", 0.5)
+PREFETCH_WORKERS = positive_int_env("PREFETCH_WORKERS", 2)
+
+# The persona's name (added to most search queries) and greetings carry no topic.
+_IGNORED_TERMS = {"gonçalo", "goncalo", "fonseca", "hi", "hello", "hey", "thanks", "thank"}
+
+
+@dataclass
+class PrefetchStats:
+    started: int = 0
+    skipped: int = 0  # message without content terms (greetings, thanks, ...)
+    hits: int = 0
+    misses: int = 0
+    wasted: int = 0
+
+
+stats = PrefetchStats()
+_stats_lock = threading.Lock()
+
+
+def _count(field: str) -> None:
+    with _stats_lock:
+        setattr(stats, field, getattr(stats, field) + 1)
+
+
+def terms(query: str) -> Set[str]:
+    return set(tokenize(query)) - _IGNORED_TERMS
+
+
+def overlap(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+class Prefetch:
+    """One turn's speculative search; the first similar ``take`` consumes it."""
+
+    def __init__(self, query: str, top_k: int, top_n: int, future: Future) -> None:
+        self.query = query
+        self.top_k = top_k
+        self.top_n = top_n
+        self.terms = terms(query)
+        self._future = future
+        self._taken = False
+        self._lock = threading.Lock()
+
+    def __deepcopy__(self, memo) -> "Prefetch":
+        # Pipelines deep-copy their inputs; the turn's handle must stay shared.
+        return self
+
+    def take(self, query: str, top_k: int, top_n: int) -> Optional[List[SearchResult]]:
+        """The prefetched results if ``query`` matches, waiting for them if still running."""
+        similarity = overlap(self.terms, terms(query))
+        with self._lock:
+            if self._taken or (top_k, top_n) != (self.top_k, self.top_n):
+                return None
+            if similarity < PREFETCH_MIN_OVERLAP:
+                _count("misses")
+                logger.info("RAG prefetch miss (overlap %.2f): %r vs %r", similarity, self.query, query)
+                return None
+            self._taken = True
+
+        try:
+            results = self._future.result()
+        except Exception as e:
+            logger.warning("RAG prefetch failed, searching again: %s", e)
+            return None
+        _count("hits")
+        logger.info("RAG prefetch hit (overlap %.2f): %r vs %r", similarity, self.query, query)
+        return results
+
+    def close(self) -> None:
+        """End of turn: an untaken prefetch is wasted, and cancelled if it has not started."""
+        with self._lock:
+            if self._taken:
+                return
+            self._taken = True
+        self._future.cancel()
+        _count("wasted")
+
+
+def start(query: str, top_k: int, top_n: int) -> Optional[Prefetch]:
+    if not RAG_PREFETCH_ENABLED:
+        return None
+    if not terms(query):
+        _count("skipped")
+        return None
+    _count("started")
+    # Run in a copy of the caller's context so the search's spans stay in the turn's trace.
+    future = _executor().submit(contextvars.copy_context().run, rag.search, query, top_k, top_n)
+    return Prefetch(query, top_k, top_n, future)
+
+
+def _executor() -> ThreadPoolExecutor:
+    return resources.get_or_create(
+        ("executor", "prefetch"),
+        lambda: ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch"),
+    )
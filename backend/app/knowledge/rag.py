@@ -1,10 +1,29 @@
 import logging
+import os
+import time
+from typing import Optional
 
 import knowledge.vector_store as vector_store
+from knowledge.bm25 import BM25_INDEX_PATH, BM25Index, reciprocal_rank_fusion, tokenize
+from knowledge.retrieval_cache import RETRIEVAL_CACHE_ENABLED, retrieval_cache
 from knowledge.vector_store import SearchResult
+from tracing_utils import span
+from utils import resources
+from utils.settings import bool_env, positive_float_env, positive_int_env
 
 logger = logging.getLogger(__name__)
 
+LEXICAL_RETRIEVAL_ENABLED = bool_env("LEXICAL_RETRIEVAL_ENABLED", True)
+# IDF-weighted share of query terms the best lexical hit must contain to skip dense search.
+LEXICAL_STRONG_COVERAGE = positive_float_env("LEXICAL_STRONG_COVERAGE", 0.9)
+# Also needed to skip it: enough distinct query terms that full coverage means something
+# ("projects" is covered by many records), and a best hit that clearly beats the second.
+LEXICAL_STRONG_MIN_TERMS = positive_int_env("LEXICAL_STRONG_MIN_TERMS", 3)
+LEXICAL_STRONG_MARGIN = positive_float_env("LEXICAL_STRONG_MARGIN", 1.2)
+# Dense candidates requested when lexical results are fused in.
+DENSE_TOP_K_WITH_LEXICAL = positive_int_env("DENSE_TOP_K_WITH_LEXICAL", 15)
+RRF_K = 60
+
 REWRITE_SYS = """You are a search-query generator for a RAG system.
 Rewrite the last user message into a concise search query for retrieving the most relevant docs.
 Use recent conversation only when it is about the same topic as the last message; if the topic has changed, ignore unrelated history.
@@ -21,7 +40,71 @@ Rules:
 
 
 def search(query: str, top_k: int = 100, top_n=35) -> list[SearchResult]:
-    return vector_store.search(query, top_k, top_n)
+    """Lexical BM25 hits fused with dense hits by reciprocal rank fusion.
+
+    A strong lexical match answers on its own; any lexical hits shrink the dense ``top_k``.
+    """
+    with span("rag.search", top_k=top_k, top_n=top_n) as s:
+        lexical, strong = _lexical_search(query, top_n, s)
+        if strong:
+            s.set_attribute("rag.dense_skipped", True)
+            return lexical
+
+        dense_top_k = min(top_k, DENSE_TOP_K_WITH_LEXICAL) if lexical else top_k
+        s.set_attribute("rag.dense_top_k", dense_top_k)
+        dense = _dense_search(query, dense_top_k, min(top_n, dense_top_k))
+        s.set_attribute("rag.dense_hits", len(dense))
+        if not lexical:
+            return dense
+
+        started = time.perf_counter()
+        by_id = {r["id"]: r for r in lexical}
+        by_id.update({r["id"]: r for r in dense})
+        fused = reciprocal_rank_fusion([[r["id"] for r in dense], [r["id"] for r in lexical]], k=RRF_K)
+        results = [SearchResult(id=i, text=by_id[i]["text"], score=score) for i, score in fused[:top_n]]
+        s.set_attribute("rag.fusion_ms", (time.perf_counter() - started) * 1000)
+        s.set_attribute("rag.fused_hits", len(results))
+        return results
+
+
+def _dense_search(query: str, top_k: int, top_n: int) -> list[SearchResult]:
+    if not RETRIEVAL_CACHE_ENABLED:
+        return vector_store.search(query, top_k, top_n)
+    results = retrieval_cache.get_or_search(query, top_k, top_n, vector_store.search)
+    logger.info("Retrieval cache stats: %s", retrieval_cache.stats)
+    return results
+
+
+def _lexical_search(query: str, top_n: int, s) -> tuple[list[SearchResult], bool]:
+    """Return BM25 results and whether the best one covers the query well enough to stand alone."""
+    index = _bm25_index()
+    if index is None:
+        return [], False
+
+    started = time.perf_counter()
+    hits = index.search(query, top_n)
+    strong = (
+        bool(hits)
+        and len(set(tokenize(query))) >= LEXICAL_STRONG_MIN_TERMS
+        and (len(hits) == 1 or hits[0][1] >= LEXICAL_STRONG_MARGIN * hits[1][1])
+        and index.coverage(query, hits[0][0]) >= LEXICAL_STRONG_COVERAGE
+    )
+    s.set_attribute("rag.lexical_hits", len(hits))
+    s.set_attribute("rag.lexical_strong", strong)
+    s.set_attribute("rag.lexical_ms", (time.perf_counter() - started) * 1000)
+    return [SearchResult(id=index.ids[d], text=index.texts[d], score=score) for d, score in hits], strong
+
+
+def _bm25_index() -> Optional[BM25Index]:
+    def load() -> Optional[BM25Index]:
+        if not LEXICAL_RETRIEVAL_ENABLED:
+            return None
+        if not os.path.exists(BM25_INDEX_PATH):
+            logger.warning("No BM25 index at %s, using dense retrieval only", BM25_INDEX_PATH)
+            return None
+        return BM25Index.load(BM25_INDEX_PATH)
+
+    return resources.get_or_create(("bm25", BM25_INDEX_PATH), load)
 
 
 def format_results(results):
@@ -0,0 +1,172 @@
+"""Two-tier cache for ``rag.search`` results.
+
+Tier one is an in-process LRU with a short TTL; tier two is the shared ``KnowledgeCache``
+DynamoDB table whose items expire through its TTL attribute. Keys cover the normalised
+query, ``top_k``, ``top_n`` and the index version, so ``invalidate()`` after a re-ingest
+makes every existing entry unreachable without deleting anything.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+import boto3
+
+from knowledge.vector_store import SearchResult
+from utils import resources
+from utils.settings import bool_env, positive_int_env
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_CACHE_ENABLED = bool_env("RETRIEVAL_CACHE_ENABLED", True)
+KNOWLEDGE_CACHE_TABLE = os.environ.get("KNOWLEDGE_CACHE_TABLE", "KnowledgeCache")
+LOCAL_MAX_ENTRIES = positive_int_env("RETRIEVAL_CACHE_MAX_ENTRIES", 256)
+LOCAL_TTL_SECONDS = positive_int_env("RETRIEVAL_CACHE_LOCAL_TTL_SECONDS", 300)
+SHARED_TTL_SECONDS = positive_int_env("RETRIEVAL_CACHE_SHARED_TTL_SECONDS", 24 * 3600)
+INDEX_VERSION_TTL_SECONDS = positive_int_env("INDEX_VERSION_TTL_SECONDS", 60)
+
+INDEX_VERSION_KEY = "INDEX_VERSION"
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    return _WS_RE.sub(" ", query).strip().strip("?!.").strip().lower()
+
+
+@dataclass
+class RetrievalCacheStats:
+    local_hits: int = 0
+    shared_hits: int = 0
+    misses: int = 0
+
+
+class RetrievalCache:
+    def __init__(
+            self,
+            table_name: str = KNOWLEDGE_CACHE_TABLE,
+            max_entries: int = LOCAL_MAX_ENTRIES,
+            local_ttl: float = LOCAL_TTL_SECONDS,
+            shared_ttl: int = SHARED_TTL_SECONDS,
+    ) -> None:
+        self.table_name = table_name
+        self.max_entries = max_entries
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+        self.stats = RetrievalCacheStats()
+        self._local: "OrderedDict[str, Tuple[float, List[SearchResult]]]" = OrderedDict()
+        self._version: Optional[Tuple[float, int]] = None  # (read at, version)
+        self._lock = threading.Lock()
+
+    @property
+    def table(self):
+        return resources.get_or_create(
+            ("dynamodb_table", self.table_name),
+            lambda: boto3.resource("dynamodb").Table(self.table_name),
+        )
+
+    def get_or_search(
+            self, query: str, top_k: int, top_n: int, search: Callable[[str, int, int], List[SearchResult]]
+    ) -> List[SearchResult]:
+        """Return cached results for the query, calling ``search`` and filling both tiers on a miss."""
+        key = self.key(query, top_k, top_n)
+
+        results = self._get_local(key)
+        if results is not None:
+            self.stats.local_hits += 1
+            return results
+
+        results = self._get_shared(key)
+        if results is not None:
+            self.stats.shared_hits += 1
+            self._put_local(key, results)
+            return results
+
+        self.stats.misses += 1
+        results = search(query, top_k, top_n)
+        self._put_local(key, results)
+        self._put_shared(key, results)
+        return results
+
+    def key(self, query: str, top_k: int, top_n: int) -> str:
+        raw = f"{self.index_version()}|{top_k}|{top_n}|{normalize_query(query)}"
+        return "Q#" + hashlib.sha256(raw.encode()).hexdigest()
+
+    def index_version(self) -> int:
+        """Current index version, re-read from DynamoDB at most every ``INDEX_VERSION_TTL_SECONDS``."""
+        now = time.monotonic()
+        cached = self._version
+        if cached is not None and now - cached[0] < INDEX_VERSION_TTL_SECONDS:
+            return cached[1]
+        try:
+            item = self.table.get_item(Key={"cache_key": INDEX_VERSION_KEY}).get("Item", {})
+            version = int(item.get("version", 0))
+        except Exception as e:
+            logger.warning("Failed to read index version: %s", e)
+            version = cached[1] if cached else 0
+        self._version = (now, version)
+        return version
+
+    def invalidate(self) -> int:
+        """Bump the index version (call after re-ingesting) and drop local entries. Returns the new version."""
+        resp = self.table.update_item(
+            Key={"cache_key": INDEX_VERSION_KEY},
+            UpdateExpression="ADD version :one",
+            ExpressionAttributeValues={":one": 1},
+            ReturnValues="UPDATED_NEW",
+        )
+        version = int(resp["Attributes"]["version"])
+        with self._lock:
+            self._local.clear()
+            self._version = (time.monotonic(), version)
+        logger.info("Knowledge index version bumped to %d", version)
+        return version
+
+    def _get_local(self, key: str) -> Optional[List[SearchResult]]:
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return entry[1]
+
+    def _put_local(self, key: str, results: List[SearchResult]) -> None:
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.local_ttl, results)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def _get_shared(self, key: str) -> Optional[List[SearchResult]]:
+        try:
+            item = self.table.get_item(Key={"cache_key": key}).get("Item")
+        except Exception as e:
+            logger.warning("Retrieval cache read failed: %s", e)
+            return None
+        # DynamoDB deletes expired items lazily, so check the TTL ourselves too.
+        if not item or int(item.get("expires_at", 0)) <= time.time():
+            return None
+        return json.loads(item["results"])
+
+    def _put_shared(self, key: str, results: List[SearchResult]) -> None:
+        try:
+            self.table.put_item(Item={
+                "cache_key": key,
+                # JSON keeps float scores intact (the resource API would insist on Decimal).
+                "results": json.dumps(results),
+                "expires_at": int(time.time()) + self.shared_ttl,
+            })
+        except Exception as e:
+            logger.warning("Retrieval cache write failed: %s", e)
+
+
+retrieval_cache = RetrievalCache()
@@ -1,9 +1,9 @@
 import logging
 import os
-from typing import TypedDict, List
+from typing import TypedDict, List, Optional, Sequence
 
-from pinecone import Pinecone
-from pinecone.db_data import _Index as Index
+from metrics import metrics
+from utils import resources
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -12,8 +12,9 @@ PINECONE_API_KEY = os.environ.get("PINECONE_API_KEY")
 INDEX_NAME = "ragtest"
 NAMESPACE = "test"
 EMBEDDED_MODEL = "llama-text-embed-v2"
-
-pc = Pinecone(api_key=PINECONE_API_KEY)
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "pinecone").lower()  # "pinecone" | "local"
+UPSERT_BATCH_SIZE = 96
+DELETE_BATCH_SIZE = 1000
 
 
 class SearchResult(TypedDict):
@@ -22,7 +23,14 @@ class SearchResult(TypedDict):
     score: float
 
 
-def get_or_create_index(index_name: str) -> Index:
+def pinecone_client():
+    from pinecone import Pinecone
+
+    return resources.get_or_create(("pinecone", "client"), lambda: Pinecone(api_key=PINECONE_API_KEY))
+
+
+def get_or_create_index(index_name: str):
+    pc = pinecone_client()
     if not pc.has_index(index_name):
         logger.info(f"Creating index '{index_name}'")
         pc.create_index_for_model(
@@ -37,10 +45,38 @@ def get_or_create_index(index_name: str) -> Index:
     return pc.Index(index_name)
 
 
-index = get_or_create_index(INDEX_NAME)
+def pinecone_index():
+    """The hosted index, resolved (and created if missing) on first use rather than at import."""
+    return resources.get_or_create(("pinecone", "index", INDEX_NAME), lambda: get_or_create_index(INDEX_NAME))
+
+
+def local_index():
+    from knowledge.local_index import LocalIndex
+
+    return resources.get_or_create(("local_index", "default"), LocalIndex.load)
+
+
+def _query_embedder():
+    from knowledge.local_index import PineconeEmbedder
+
+    return resources.get_or_create(("embedder", "query"), PineconeEmbedder)
 
 
-def search(query: str, top_k: int = 100, top_n=35) -> List[SearchResult]:
+def set_query_embedder(embedder) -> None:
+    """Use ``embedder`` (a ``knowledge.local_index.Embedder``) for local-backend queries."""
+    resources.invalidate(("embedder", "query"))
+    resources.get_or_create(("embedder", "query"), lambda: embedder)
+
+
+def search(
+        query: str, top_k: int = 100, top_n=35, query_embedding: Optional[Sequence[float]] = None
+) -> List[SearchResult]:
+    if VECTOR_BACKEND == "local":
+        return _search_local(query, top_k, top_n, query_embedding)
+    return _search_pinecone(query, top_k, top_n)
+
+
+def _search_pinecone(query: str, top_k: int, top_n: int) -> List[SearchResult]:
     search_payload = {"top_k": top_k, "inputs": {"text": query}}
     rerank_payload = {
         "model": "bge-reranker-v2-m3",
@@ -50,7 +86,8 @@ def search(query: str, top_k: int = 100, top_n=35) -> List[SearchResult]:
             "truncate": "END"
         }
     }
-    search_response = index.search(namespace=NAMESPACE, query=search_payload, rerank=rerank_payload)
+    with metrics.timer("DependencyLatency", Dependency="pinecone.search"):
+        search_response = pinecone_index().search(namespace=NAMESPACE, query=search_payload, rerank=rerank_payload)
 
     return [
         SearchResult(
@@ -61,6 +98,33 @@ def search(query: str, top_k: int = 100, top_n=35) -> List[SearchResult]:
     ]
 
 
-def upsert_records(records: List[dict]):
-    index.upsert_records(NAMESPACE, records)
+def _search_local(
+        query: str, top_k: int, top_n: int, query_embedding: Optional[Sequence[float]]
+) -> List[SearchResult]:
+    """Exact cosine search of the local snapshot; without a reranker, the best ``top_n`` of ``top_k``."""
+    index = local_index()
+    if query_embedding is None:
+        query_embedding = _query_embedder().embed([query], "query")[0]
+    hits = index.search(query_embedding, min(top_k, top_n))[0]
+    return [SearchResult(id=index.ids[i], text=index.text(i), score=score) for i, score in hits]
+
+
+def upsert_records(records: List[dict], batch_size: int = UPSERT_BATCH_SIZE):
+    """Upsert in batches; integrated-embedding indexes accept at most 96 records per request."""
+    index = pinecone_index()
+    for start in range(0, len(records), batch_size):
+        index.upsert_records(NAMESPACE, records[start:start + batch_size])
     logger.info(f"Upserted {len(records)} records into namespace '{NAMESPACE}'.")
+
+
+def list_record_ids(prefix: str) -> List[str]:
+    return [i for page in pinecone_index().list(prefix=prefix, namespace=NAMESPACE) for i in page]
+
+
+def delete_records(ids: Sequence[str], batch_size: int = DELETE_BATCH_SIZE):
+    index = pinecone_index()
+    ids = list(ids)
+    for start in range(0, len(ids), batch_size):
+        index.delete(ids=ids[start:start + batch_size], namespace=NAMESPACE)
+    if ids:
+        logger.info(f"Deleted {len(ids)} records from namespace '{NAMESPACE}'.")
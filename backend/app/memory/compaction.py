@@ -0,0 +1,197 @@
+"""Deferred, bounded rolling summarisation.
+
+``MemoryManager.save_turn`` only enqueues a compaction request; the summary is rebuilt
+off the chat critical path by ``compact_session`` (run by ``summary_compaction_handler``
+or, in tests, by ``InProcessCompactionQueue.drain``).
+
+The summary has two tiers: short segment summaries of recently rolled-out messages, and
+one digest. When digest plus segments pass ``SUMMARY_CEILING_TOKENS`` they are
+re-summarised into a new digest capped at ``DIGEST_MAX_TOKENS``, so the prompt prefix
+stays bounded however long the session runs.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from queue import Empty, SimpleQueue
+from typing import List, Protocol
+
+import haystack
+from haystack_integrations.components.generators.amazon_bedrock import AmazonBedrockChatGenerator
+
+from memory.conversation_store import ConcurrentUpdateError, ConversationStore, Message, SummaryState
+from memory.tokens import count_tokens
+from metrics import metrics
+from services import notifications
+from tracing_utils import span
+from utils import resources
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_TRIGGER_TOKENS = 1_500
+SUMMARY_CEILING_TOKENS = 800
+DIGEST_MAX_TOKENS = 400
+SUMMARY_MODEL = "eu.amazon.nova-micro-v1:0"
+
+
+def compact_session(session_id: str) -> bool:
+    """Fold the oldest unsummarised messages into the summary until they fit the trigger.
+
+    Returns ``True`` if a new summary was stored.
+    """
+    store = ConversationStore(session_id)
+    state = store.load_summary()
+    pending = store.get_messages_after(state.covered_until)
+    pending_tokens = sum(m.tokens for m in pending)
+
+    summary = SummaryState(
+        covered_until=state.covered_until,
+        digest=state.digest,
+        segments=list(state.segments),
+        compactions=state.compactions,
+    )
+    with span("summary.compaction", session_id=session_id) as s:
+        while pending and pending_tokens > SUMMARY_TRIGGER_TOKENS:
+            cut = max(1, len(pending) // 4)
+            to_summarise, pending = pending[:cut], pending[cut:]
+            try:
+                segment = _summarise(to_summarise)
+            except Exception as e:
+                logger.warning("Summary generation failed–keeping old summary. %s", e)
+                break
+
+            summary.segments.append(segment)
+            summary.covered_until = f"MSG#{to_summarise[-1].message_id}"
+            pending_tokens -= sum(m.tokens for m in to_summarise)
+
+        if summary.covered_until == state.covered_until:
+            return False
+
+        _fold_segments_if_needed(summary)
+        summary.content = _render(summary)
+
+        digest_tokens = count_tokens(summary.digest) if summary.digest else 0
+        summary_tokens = count_tokens(summary.content)
+        s.set_attribute("summary.digest_tokens", digest_tokens)
+        s.set_attribute("summary.tokens", summary_tokens)
+        s.set_attribute("summary.segments", len(summary.segments))
+        s.set_attribute("summary.compactions", summary.compactions)
+
+        try:
+            version = store.save_compaction(summary, state.covered_until)
+        except ConcurrentUpdateError as e:
+            logger.info("Skipping compaction for %s: %s", session_id, e)
+            return False
+
+    metrics.put("Compactions", 1, unit="Count")
+    metrics.put("SummaryDigestTokens", digest_tokens, unit="Count")
+    metrics.put("SummaryTokens", summary_tokens, unit="Count")
+    logger.info(
+        "Compacted session %s up to %s (version %d) digest_tokens=%d summary_tokens=%d segments=%d compactions=%d",
+        session_id, summary.covered_until, version, digest_tokens, summary_tokens,
+        len(summary.segments), summary.compactions,
+    )
+    return True
+
+
+def _fold_segments_if_needed(summary: SummaryState) -> None:
+    """Re-summarise digest + segments into a single capped digest once over the ceiling."""
+    tokens = sum(count_tokens(t) for t in [summary.digest, *summary.segments] if t)
+    if tokens <= SUMMARY_CEILING_TOKENS:
+        return
+
+    try:
+        digest = _generate(
+            f"Condense the following conversation notes into at most {DIGEST_MAX_TOKENS // 2} words. "
+            "Keep names, companies, contact details, commitments and open questions; drop small talk:\n\n"
+            + "\n".join(t for t in [summary.digest, *summary.segments] if t)
+        )
+    except Exception as e:
+        # Keep the segments; the next compaction will try folding again.
+        logger.warning("Digest compaction failed–keeping segments. %s", e)
+        return
+
+    summary.digest = _truncate_tokens(digest, DIGEST_MAX_TOKENS)
+    summary.segments = []
+    summary.compactions += 1
+
+
+def _truncate_tokens(text: str, max_tokens: int) -> str:
+    """Hard cap in case the model ignores the requested length."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    while words and count_tokens(" ".join(words)) > max_tokens:
+        words = words[: int(len(words) * 0.9)]
+    return " ".join(words)
+
+
+def _render(summary: SummaryState) -> str:
+    return "\n".join(t for t in [summary.digest, *summary.segments] if t)
+
+
+def _summarise(messages: List[Message]) -> str:
+    text_block = "\n".join(f"{m.role}: {m.content}" for m in messages)
+    return _generate(
+        "Summarise the following dialogue in 3–4 sentences, "
+        "preserving key facts and decisions:\n\n" + text_block
+    )
+
+
+def _generate(instruction: str) -> str:
+    return resources.get_or_create(
+        ("bedrock", SUMMARY_MODEL),
+        lambda: AmazonBedrockChatGenerator(model=SUMMARY_MODEL),
+    ).run([haystack.dataclasses.ChatMessage.from_user(instruction)])["replies"][-1].text
+
+
+class CompactionQueue(Protocol):
+    def enqueue(self, session_id: str) -> None:
+        ...
+
+
+class EventBridgeCompactionQueue:
+    """Publishes a ``SummaryCompactionRequested`` event, consumed via SQS by the worker Lambda."""
+
+    def enqueue(self, session_id: str) -> None:
+        notifications.send_summary_compaction_event(session_id)
+
+
+class InProcessCompactionQueue:
+    """Local backend for tests: jobs are held until ``drain`` runs them."""
+
+    def __init__(self) -> None:
+        self.jobs = SimpleQueue[str]()
+
+    def enqueue(self, session_id: str) -> None:
+        self.jobs.put(session_id)
+
+    def drain(self) -> int:
+        """Run every queued job; returns how many were processed."""
+        processed = 0
+        while True:
+            try:
+                session_id = self.jobs.get_nowait()
+            except Empty:
+                return processed
+            compact_session(session_id)
+            processed += 1
+
+
+_queue: CompactionQueue | None = None
+
+
+def get_compaction_queue() -> CompactionQueue:
+    """Backend selected by ``COMPACTION_QUEUE`` (``eventbridge`` or ``local``)."""
+    global _queue
+    if _queue is None:
+        if os.environ.get("COMPACTION_QUEUE", "eventbridge").lower() == "local":
+            _queue = InProcessCompactionQueue()
+        else:
+            _queue = EventBridgeCompactionQueue()
+    return _queue
+
+
+def set_compaction_queue(queue: CompactionQueue) -> None:
+    global _queue
+    _queue = queue
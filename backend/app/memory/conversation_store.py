@@ -1,19 +1,27 @@
 import logging
 import os
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List, Optional
+from typing import Iterator, List, Optional
 
 import boto3
 from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
 import ulid
 
+from memory.tokens import count_tokens
+
 DYNAMODB_TABLE = os.environ.get("DYNAMODB_TABLE", "Conversations")
 dynamodb = boto3.resource("dynamodb")
 table = dynamodb.Table(DYNAMODB_TABLE)
 
 SUMMARY_ID = "SUMMARY"
 META_ID = "META"
+CONNECTION_ID = "CONNECTION"
+CONNECTION_TTL_SECONDS = 24 * 60 * 60
+MESSAGE_PREFIX = "MSG#"
+RECENT_PAGE_SIZE = 20
 
 
 @dataclass
@@ -23,6 +31,26 @@ class Message:
     role: str
     content: str
     timestamp: str
+    tokens: int = 0
+
+
+@dataclass
+class SummaryState:
+    """The running summary.
+
+    ``content`` is what prompts see: the capped ``digest`` followed by the recent
+    ``segments`` that have not been folded into it yet.
+    """
+    content: str = ""
+    version: int = 0
+    covered_until: str = ""  # SK of the newest message already folded into ``content``
+    digest: str = ""
+    segments: List[str] = field(default_factory=list)
+    compactions: int = 0  # times the segments were re-summarised into the digest
+
+
+class ConcurrentUpdateError(Exception):
+    """The session's version changed since it was read (another writer got there first)."""
 
 
 @dataclass
@@ -42,8 +70,11 @@ class ConversationStore:
     Wrapper over a DynamoDB table with generic ``PK``/``SK`` keys.
 
     Chat history items: ``SK = "MSG#<id>"``
-    The running summary: ``SK = "SUMMARY"``
+    The running summary: ``SK = "SUMMARY"``; its ``version`` attribute is bumped on every
+    turn and compaction and guards against lost updates. ``covered_until`` records the
+    last message folded into the summary.
     Session metadata: ``SK = "META"``.
+    Connection state: ``SK = "CONNECTION"`` (expires via the ``expires_at`` TTL).
     """
 
     def __init__(self, session_id: Optional[str] = None):
@@ -61,64 +92,269 @@ class ConversationStore:
         table.put_item(
             Item={
                 "PK": self.session_id,
-                "SK": f"MSG#{message_id}",
+                "SK": f"{MESSAGE_PREFIX}{message_id}",
                 "role": role,
                 "content": content,
                 "timestamp": timestamp,
+                "tokens": count_tokens(content),
             }
         )
 
+    def append_turn(
+            self,
+            user_msg: str,
+            assistant_msg: str,
+            expected_version: int,
+            summary: Optional[str] = None,
+    ) -> int:
+        """Write both messages and bump the session version in one transaction.
+
+        ``summary`` is written only when given, i.e. when it changed during the turn.
+        Raises ``ConcurrentUpdateError`` if the stored version is not ``expected_version``;
+        nothing is written in that case. Returns the new version.
+        """
+        timestamp = datetime.utcnow().isoformat()
+        user_id = ulid.new()
+        # Consecutive ids keep the assistant reply sorted after the user message.
+        assistant_id = ulid.from_int(user_id.int + 1)
+        new_version = expected_version + 1
+        self.logger.debug("append_turn session=%s version=%d", self.session_id, new_version)
+
+        update_expression = "SET version = :new_version, #ts = :ts"
+        values = {":new_version": new_version, ":ts": timestamp}
+        if summary is not None:
+            update_expression += ", content = :summary, #role = :role"
+            values.update({":summary": summary, ":role": "summary"})
+        if expected_version:
+            condition = "version = :expected"
+            values[":expected"] = expected_version
+        else:
+            condition = "attribute_not_exists(version)"
+
+        try:
+            # The resource's client serializes native Python values, like Table does.
+            table.meta.client.transact_write_items(
+                TransactItems=[
+                    self._put_message(user_id, "user", user_msg, timestamp),
+                    self._put_message(assistant_id, "assistant", assistant_msg, timestamp),
+                    {
+                        "Update": {
+                            "TableName": DYNAMODB_TABLE,
+                            "Key": {"PK": self.session_id, "SK": SUMMARY_ID},
+                            "UpdateExpression": update_expression,
+                            "ConditionExpression": condition,
+                            "ExpressionAttributeNames": {
+                                "#ts": "timestamp",
+                                **({"#role": "role"} if summary is not None else {}),
+                            },
+                            "ExpressionAttributeValues": values,
+                        }
+                    },
+                ]
+            )
+        except ClientError as e:
+            reasons = e.response.get("CancellationReasons", [])
+            if any(r.get("Code") == "ConditionalCheckFailed" for r in reasons):
+                raise ConcurrentUpdateError(
+                    f"session {self.session_id} moved past version {expected_version}"
+                ) from e
+            raise
+
+        return new_version
+
+    def _put_message(self, message_id, role: str, content: str, timestamp: str) -> dict:
+        return {
+            "Put": {
+                "TableName": DYNAMODB_TABLE,
+                "Item": {
+                    "PK": self.session_id,
+                    "SK": f"{MESSAGE_PREFIX}{message_id}",
+                    "role": role,
+                    "content": content,
+                    "timestamp": timestamp,
+                    "tokens": count_tokens(content),
+                },
+            }
+        }
+
     def get_conversation(self) -> List[Message]:
-        """Return chat messages"""
-        resp = table.query(
-            KeyConditionExpression=Key("PK").eq(self.session_id),
-            ScanIndexForward=True,  # old‑>new
-        )
-        items = [
-            item
-            for item in resp.get("Items", [])
-            if item["SK"] not in (SUMMARY_ID, META_ID)
-               and item.get("content")
+        """Return every chat message, oldest first."""
+        return [
+            self._to_message(item)
+            for item in self._query_messages(newest_first=False)
         ]
 
+    def get_recent_messages(self, token_budget: int, after: str = "") -> List[Message]:
+        """Return the newest messages that fit in ``token_budget``, oldest first.
+
+        Pages are read newest-first and only until the budget is full, so the cost
+        does not grow with the length of the session. Messages at or before the ``after``
+        sort key (already summarised) are not returned.
+        """
+        total = 0
+        newest_first: List[Message] = []
+        for item in self._query_messages(newest_first=True, page_size=RECENT_PAGE_SIZE):
+            if after and item["SK"] <= after:
+                break
+            message = self._to_message(item)
+            if total + message.tokens > token_budget:
+                break
+            newest_first.append(message)
+            total += message.tokens
+
+        newest_first.reverse()
+        return newest_first
+
+    def get_messages_after(self, after: str = "") -> List[Message]:
+        """Return the messages newer than the ``after`` sort key, oldest first."""
         return [
-            Message(
-                session_id=item["PK"],
-                message_id=item["SK"][4:],
-                role=item["role"],
-                content=item["content"],
-                timestamp=item["timestamp"],
-            )
-            for item in items
+            self._to_message(item)
+            for item in self._query_messages(newest_first=False, after=after)
         ]
 
+    def _query_messages(
+            self,
+            newest_first: bool,
+            page_size: Optional[int] = None,
+            after: str = "",
+    ) -> Iterator[dict]:
+        """Lazily page through ``MSG#`` items, projecting only what ``Message`` needs."""
+        if after:
+            # "~" sorts after every ULID character, so this spans all later messages.
+            sort_key = Key("SK").between(after, f"{MESSAGE_PREFIX}~")
+        else:
+            sort_key = Key("SK").begins_with(MESSAGE_PREFIX)
+        kwargs = {
+            "KeyConditionExpression": Key("PK").eq(self.session_id) & sort_key,
+            "ScanIndexForward": not newest_first,
+            "ProjectionExpression": "PK, SK, #role, content, #ts, tokens",
+            "ExpressionAttributeNames": {"#role": "role", "#ts": "timestamp"},
+        }
+        if page_size:
+            kwargs["Limit"] = page_size
+
+        while True:
+            resp = table.query(**kwargs)
+            for item in resp.get("Items", []):
+                if item.get("content") and item["SK"] != after:
+                    yield item
+            last_key = resp.get("LastEvaluatedKey")
+            if not last_key:
+                return
+            kwargs["ExclusiveStartKey"] = last_key
+
+    @staticmethod
+    def _to_message(item: dict) -> Message:
+        return Message(
+            session_id=item["PK"],
+            message_id=item["SK"][len(MESSAGE_PREFIX):],
+            role=item["role"],
+            content=item["content"],
+            timestamp=item["timestamp"],
+            # Items written before token counts were stored are counted once on load.
+            tokens=int(item["tokens"]) if "tokens" in item else count_tokens(item["content"]),
+        )
+
     def clear_conversation(self) -> None:
         """Delete all items for this session, including the summary."""
-        resp = table.query(KeyConditionExpression=Key("PK").eq(self.session_id))
+        kwargs = {"KeyConditionExpression": Key("PK").eq(self.session_id)}
         with table.batch_writer() as batch:
-            for itm in resp.get("Items", []):
-                batch.delete_item(
-                    Key={"PK": itm["PK"], "SK": itm["SK"]}
-                )
+            while True:
+                resp = table.query(**kwargs)
+                for itm in resp.get("Items", []):
+                    batch.delete_item(
+                        Key={"PK": itm["PK"], "SK": itm["SK"]}
+                    )
+                if not resp.get("LastEvaluatedKey"):
+                    break
+                kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
 
     def get_summary(self) -> Optional[str]:
         """Fetch the running summary"""
+        return self.load_summary().content or None
+
+    def load_summary(self) -> SummaryState:
+        """Fetch the running summary together with the session version."""
         resp = table.get_item(Key={"PK": self.session_id, "SK": SUMMARY_ID})
-        return resp.get("Item", {}).get("content")
+        item = resp.get("Item", {})
+        content = item.get("content") or ""
+        return SummaryState(
+            content=content,
+            version=int(item.get("version", 0)),
+            covered_until=item.get("covered_until") or "",
+            # Summaries written before tiering are one flat text; treat it as the digest.
+            digest=item["digest"] if "digest" in item else content,
+            segments=list(item.get("segments") or []),
+            compactions=int(item.get("compactions", 0)),
+        )
+
+    def save_compaction(self, summary: SummaryState, expected_covered_until: str) -> int:
+        """Store a compacted summary and bump the session version.
+
+        Conditioned on ``covered_until`` still being ``expected_covered_until`` so two
+        workers compacting the same session cannot overwrite each other. Raises
+        ``ConcurrentUpdateError`` otherwise. Returns the new version.
+        """
+        values = {
+            ":summary": summary.content,
+            ":digest": summary.digest,
+            ":segments": summary.segments,
+            ":compactions": summary.compactions,
+            ":role": "summary",
+            ":covered": summary.covered_until,
+            ":ts": datetime.utcnow().isoformat(),
+            ":zero": 0,
+            ":one": 1,
+        }
+        if expected_covered_until:
+            condition = "covered_until = :expected"
+            values[":expected"] = expected_covered_until
+        else:
+            condition = "attribute_not_exists(covered_until)"
+
+        try:
+            resp = table.update_item(
+                Key={"PK": self.session_id, "SK": SUMMARY_ID},
+                UpdateExpression=(
+                    "SET content = :summary, digest = :digest, #segments = :segments, "
+                    "compactions = :compactions, #role = :role, covered_until = :covered, #ts = :ts, "
+                    "version = if_not_exists(version, :zero) + :one"
+                ),
+                ConditionExpression=condition,
+                ExpressionAttributeNames={"#role": "role", "#ts": "timestamp", "#segments": "segments"},
+                ExpressionAttributeValues=values,
+                ReturnValues="UPDATED_NEW",
+            )
+        except table.meta.client.exceptions.ConditionalCheckFailedException as e:
+            raise ConcurrentUpdateError(
+                f"session {self.session_id} was compacted past {expected_covered_until!r}"
+            ) from e
+
+        return int(resp["Attributes"]["version"])
+
+    def load_version(self) -> int:
+        """Read only the session version (a single-attribute get, used to validate caches)."""
+        resp = table.get_item(
+            Key={"PK": self.session_id, "SK": SUMMARY_ID},
+            ProjectionExpression="version",
+        )
+        return int(resp.get("Item", {}).get("version", 0))
 
     def save_summary(self, text: str) -> None:
-        """Create or overwrite the session's running summary"""
+        """Create or overwrite the session's running summary and bump the version."""
         timestamp = datetime.utcnow().isoformat()
         self.logger.debug("save_summary session=%s len=%d", self.session_id, len(text))
 
-        table.put_item(
-            Item={
-                "PK": self.session_id,
-                "SK": SUMMARY_ID,
-                "role": "summary",
-                "content": text,
-                "timestamp": timestamp,
-            }
+        table.update_item(
+            Key={"PK": self.session_id, "SK": SUMMARY_ID},
+            UpdateExpression=(
+                "SET #role = :role, content = :content, #ts = :ts, "
+                "version = if_not_exists(version, :zero) + :one"
+            ),
+            ExpressionAttributeNames={"#role": "role", "#ts": "timestamp"},
+            ExpressionAttributeValues={
+                ":role": "summary", ":content": text, ":ts": timestamp, ":zero": 0, ":one": 1,
+            },
         )
 
     def save_user_info(self, info: UserInfo) -> None:
@@ -152,3 +388,26 @@ class ConversationStore:
             company=item.get("company"),
             role=item.get("role"),
         )
+
+    # ---------------------------------------------------------------------
+    # Connection state
+    # ---------------------------------------------------------------------
+    def mark_disconnected(self) -> None:
+        """Record that the WebSocket connection behind this session is gone."""
+        table.put_item(
+            Item={
+                "PK": self.session_id,
+                "SK": CONNECTION_ID,
+                "status": "gone",
+                "timestamp": datetime.utcnow().isoformat(),
+                "expires_at": int(time.time()) + CONNECTION_TTL_SECONDS,
+            }
+        )
+
+    def is_disconnected(self) -> bool:
+        resp = table.get_item(
+            Key={"PK": self.session_id, "SK": CONNECTION_ID},
+            ProjectionExpression="#s",
+            ExpressionAttributeNames={"#s": "status"},
+        )
+        return resp.get("Item", {}).get("status") == "gone"
@@ -1,43 +1,59 @@
 from __future__ import annotations
 
 import logging
+from collections import deque
 from dataclasses import dataclass, field
-from typing import List
+from typing import Deque, Iterable
 
-import haystack
-from haystack_integrations.components.generators.amazon_bedrock import AmazonBedrockChatGenerator
-
-from memory.conversation_store import ConversationStore
+from memory.compaction import SUMMARY_TRIGGER_TOKENS, get_compaction_queue
+from memory.conversation_store import ConcurrentUpdateError, ConversationStore
+from memory.session_cache import CachedMessage, SessionSnapshot, session_cache
+from memory.tokens import count_tokens
+from tracing_utils import span
 
 logger = logging.getLogger(__name__)
 
 MAX_WINDOW_TOKENS = 3_000
-SUMMARY_TRIGGER_TOKENS = 1_500
-
-
-def approx_tokens(text: str) -> int:
-    """Crude token estimator (4chars ~1token)."""
-    return max(1, len(text) // 4)
 
 
 @dataclass
 class ChatMessage:
     role: str  # "user" | "assistant"
     content: str
+    tokens: int = 0
 
 
 @dataclass
 class MemoryManager:
-    """Window+running summary memory for a chat session."""
+    """Window+running summary memory for a chat session.
+
+    ``window_tokens`` is kept in step with ``window`` so budget checks never re-count it.
+    State is reused from ``session_cache`` when the stored session version still matches.
+    """
     session_id: str
     store: ConversationStore = field(init=False)
     summary: str = field(default="")
-    window: List[ChatMessage] = field(default_factory=list)
+    window: Deque[ChatMessage] = field(default_factory=deque)
+    window_tokens: int = field(default=0)
+    version: int = field(default=0)
+    covered_until: str = field(default="")
 
     def __post_init__(self) -> None:
         self.store = ConversationStore(self.session_id)
-        self.summary = self.store.get_summary() or ""
-        self.window = self._build_window()
+        with span("memory.load", session_id=self.session_id) as s:
+            snapshot = session_cache.lookup(self.session_id, self.store.load_version)
+            s.set_attribute("memory.cache_hit", snapshot is not None)
+            if snapshot is not None:
+                self._restore(snapshot)
+            else:
+                state = self.store.load_summary()
+                self.summary = state.content
+                self.version = state.version
+                self.covered_until = state.covered_until
+                self._build_window()
+                self._publish()
+            s.set_attribute("memory.window_messages", len(self.window))
+            s.set_attribute("memory.window_tokens", self.window_tokens)
 
     def get_memory(self) -> dict:
         """Return memory as a ``dict`` with summary and conversation list."""
@@ -47,62 +63,74 @@ class MemoryManager:
         }
 
     def save_turn(self, user_msg: str, assistant_msg: str) -> None:
-        """Persist new messages, update summary, prune window."""
-        self.store.add_message("user", user_msg)
-        self.store.add_message("assistant", assistant_msg)
-
-        self.window.append(ChatMessage(role="user", content=user_msg))
-        self.window.append(ChatMessage(role="assistant", content=assistant_msg))
-        self._trim_window()
-
-        while self._window_tokens() > SUMMARY_TRIGGER_TOKENS:
-            self._roll_oldest_into_summary()
-
-        self.store.save_summary(self.summary)
-
-    def _build_window(self) -> List[ChatMessage]:
-        """Return the most recent messages up to MAX_WINDOW_TOKENS."""
-        raw = self.store.get_conversation()
-        total = 0
-        window: List[ChatMessage] = []
-        for m in reversed(raw):
-            tkn = approx_tokens(m.content)
-            if total + tkn > MAX_WINDOW_TOKENS:
-                break
-            window.insert(0, ChatMessage(role=m.role, content=m.content))
-            total += tkn
-        return window
-
-    def _window_tokens(self) -> int:
-        return sum(approx_tokens(m.content) for m in self.window)
+        """Persist the turn in one round trip, prune the window, request compaction if due.
+
+        Summarisation itself runs later in the compaction worker, off the chat path.
+        """
+        with span("memory.save_turn", session_id=self.session_id) as s:
+            try:
+                self.version = self.store.append_turn(user_msg, assistant_msg, self.version)
+            except ConcurrentUpdateError as e:
+                # Another turn or a compaction of this session landed first; our messages are
+                # independent of it, so pick up the stored state and write them again.
+                logger.warning("Concurrent update on session %s, retrying: %s", self.session_id, e)
+                s.set_attribute("memory.retried", True)
+                state = self.store.load_summary()
+                self.summary = state.content
+                self.covered_until = state.covered_until
+                self.version = self.store.append_turn(user_msg, assistant_msg, state.version)
+                # Our window is stale (missing the other turn, or holding messages a compaction
+                # folded); reload it, with this turn, rather than publish it under the new version.
+                self._build_window()
+            else:
+                self._append(ChatMessage(role="user", content=user_msg, tokens=count_tokens(user_msg)))
+                self._append(ChatMessage(role="assistant", content=assistant_msg, tokens=count_tokens(assistant_msg)))
+                self._trim_window()
 
-    def _trim_window(self) -> None:
-        total = self._window_tokens()
-        while self.window and total > MAX_WINDOW_TOKENS:
-            removed = self.window.pop(0)
-            total -= approx_tokens(removed.content)
-
-    def _roll_oldest_into_summary(self) -> None:
-        """Summarise the oldest 25% of the window into running summary."""
-        if not self.window:
-            return
-        cut = max(1, len(self.window) // 4)
-        to_summarise = self.window[:cut]
-        self.window = self.window[cut:]
-
-        text_block = "\n".join(f"{m.role}: {m.content}" for m in to_summarise)
-        summary_instruction = (
-                "Summarise the following dialogue in 3–4 sentences, "
-                "preserving key facts and decisions:\n\n" + text_block
+        self._publish()
+
+        if self.window_tokens > SUMMARY_TRIGGER_TOKENS:
+            get_compaction_queue().enqueue(self.session_id)
+
+    def _build_window(self) -> None:
+        """Load the most recent messages up to MAX_WINDOW_TOKENS."""
+        self._reset_window(
+            ChatMessage(role=m.role, content=m.content, tokens=m.tokens)
+            for m in self.store.get_recent_messages(MAX_WINDOW_TOKENS, after=self.covered_until)
         )
-        try:
-            new_summary = AmazonBedrockChatGenerator(
-                model="eu.amazon.nova-micro-v1:0",
-            ).run([haystack.dataclasses.ChatMessage.fromUser(summary_instruction)])["replies"][-1].text
 
-            if self.summary:
-                self.summary = f"{self.summary}\n{new_summary}"
-            else:
-                self.summary = new_summary
-        except Exception as e:
-            logger.warning("Summary generation failed–keeping old summary. %s", e)
+    def _restore(self, snapshot: SessionSnapshot) -> None:
+        self.summary = snapshot.summary
+        self.version = snapshot.version
+        self.covered_until = snapshot.covered_until
+        self.window = deque(ChatMessage(role=m.role, content=m.content, tokens=m.tokens) for m in snapshot.window)
+        self.window_tokens = snapshot.window_tokens
+
+    def _publish(self) -> None:
+        """Write the current state through to the in-process session cache."""
+        session_cache.put(self.session_id, SessionSnapshot(
+            version=self.version,
+            summary=self.summary,
+            covered_until=self.covered_until,
+            window=tuple(CachedMessage(m.role, m.content, m.tokens) for m in self.window),
+            window_tokens=self.window_tokens,
+        ))
+
+    def _reset_window(self, messages: Iterable[ChatMessage]) -> None:
+        self.window = deque()
+        self.window_tokens = 0
+        for m in messages:
+            self._append(m)
+
+    def _append(self, message: ChatMessage) -> None:
+        self.window.append(message)
+        self.window_tokens += message.tokens
+
+    def _pop_oldest(self) -> ChatMessage:
+        removed = self.window.popleft()
+        self.window_tokens -= removed.tokens
+        return removed
+
+    def _trim_window(self) -> None:
+        while self.window and self.window_tokens > MAX_WINDOW_TOKENS:
+            self._pop_oldest()
@@ -0,0 +1,115 @@
+"""Write-through, in-process cache of session memory for warm Lambda containers.
+
+Entries are validated against the session ``version`` stored on the SUMMARY item, which
+every writer (``append_turn``, compaction, ``save_summary``) bumps, so a stale entry is
+detected with one single-attribute ``get_item`` instead of re-reading the history.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+from utils.settings import positive_int_env
+
+logger = logging.getLogger(__name__)
+
+SESSION_CACHE_MAX_ENTRIES = positive_int_env("SESSION_CACHE_MAX_ENTRIES", 256)
+SESSION_CACHE_MAX_BYTES = positive_int_env("SESSION_CACHE_MAX_BYTES", 8 * 1024 * 1024)
+
+
+@dataclass(frozen=True)
+class CachedMessage:
+    role: str
+    content: str
+    tokens: int
+
+
+@dataclass(frozen=True)
+class SessionSnapshot:
+    version: int
+    summary: str
+    covered_until: str
+    window: Tuple[CachedMessage, ...]
+    window_tokens: int
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.summary.encode()) + sum(len(m.content.encode()) for m in self.window)
+
+
+@dataclass
+class SessionCacheStats:
+    hits: int = 0
+    misses: int = 0
+    stale: int = 0
+    evictions: int = 0
+
+
+class SessionCache:
+    """LRU of ``SessionSnapshot`` keyed by session id, bounded by entry count and bytes."""
+
+    def __init__(self, max_entries: int = SESSION_CACHE_MAX_ENTRIES, max_bytes: int = SESSION_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = SessionCacheStats()
+        self._entries: OrderedDict[str, SessionSnapshot] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str, version: int) -> Optional[SessionSnapshot]:
+        """Return the snapshot if it is still at ``version``; drop it otherwise."""
+        with self._lock:
+            snapshot = self._entries.get(session_id)
+            if snapshot is None:
+                self.stats.misses += 1
+                return None
+            if snapshot.version != version:
+                self.stats.stale += 1
+                self._remove(session_id)
+                return None
+            self._entries.move_to_end(session_id)
+            self.stats.hits += 1
+            return snapshot
+
+    def lookup(self, session_id: str, load_version: Callable[[], int]) -> Optional[SessionSnapshot]:
+        """Like ``get``, but only pays for ``load_version`` when an entry is cached."""
+        if session_id not in self._entries:
+            with self._lock:
+                self.stats.misses += 1
+            return None
+        return self.get(session_id, load_version())
+
+    def put(self, session_id: str, snapshot: SessionSnapshot) -> None:
+        size = snapshot.size_bytes
+        with self._lock:
+            self._remove(session_id)
+            if size > self.max_bytes:
+                return
+            self._entries[session_id] = snapshot
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats.evictions += 1
+
+    def invalidate(self, session_id: Optional[str] = None) -> None:
+        with self._lock:
+            if session_id is None:
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                self._remove(session_id)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, session_id: str) -> None:
+        snapshot = self._entries.pop(session_id, None)
+        if snapshot is not None:
+            self._bytes -= snapshot.size_bytes
+
+
+session_cache = SessionCache()
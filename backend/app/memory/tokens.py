@@ -0,0 +1,74 @@
+"""Token counting for memory budgets.
+
+The default tokenizer is a local heuristic that tracks BPE behaviour more closely than
+``len // 4``: it counts punctuation and symbols individually, splits long words into
+sub-word pieces and counts CJK characters one by one. Set ``TOKENIZER=tiktoken`` (with
+``tiktoken`` installed) or call ``set_tokenizer`` to plug in a real BPE tokenizer.
+"""
+import logging
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Protocol
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+
+
+class Tokenizer(Protocol):
+    def count(self, text: str) -> int:
+        ...
+
+
+class HeuristicTokenizer:
+    """Dependency-free estimate of BPE token counts."""
+
+    def count(self, text: str) -> int:
+        total = 0
+        for piece in _TOKEN_RE.findall(text):
+            if piece.isascii():
+                total += max(1, math.ceil(len(piece) / 4))
+                continue
+            cjk = len(_CJK_RE.findall(piece))
+            rest = len(piece) - cjk
+            total += cjk + (math.ceil(rest / 2) if rest else 0)
+        return max(1, total)
+
+
+class TiktokenTokenizer:
+    """BPE counts from ``tiktoken`` (an approximation of Claude's own vocabulary)."""
+
+    def __init__(self, encoding: str = "cl100k_base") -> None:
+        import tiktoken
+
+        self._encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        return max(1, len(self._encoding.encode(text, disallowed_special=())))
+
+
+def _default_tokenizer() -> Tokenizer:
+    if os.environ.get("TOKENIZER", "heuristic").lower() == "tiktoken":
+        try:
+            return TiktokenTokenizer()
+        except Exception as e:
+            logger.warning("tiktoken unavailable, falling back to heuristic tokenizer: %s", e)
+    return HeuristicTokenizer()
+
+
+_tokenizer: Tokenizer = _default_tokenizer()
+
+
+def set_tokenizer(tokenizer: Tokenizer) -> None:
+    """Swap the tokenizer used by ``count_tokens`` and drop cached counts."""
+    global _tokenizer
+    _tokenizer = tokenizer
+    count_tokens.cache_clear()
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    return _tokenizer.count(text)
@@ -0,0 +1,136 @@
+"""Latency and count metrics written as CloudWatch Embedded Metric Format (EMF) log lines.
+
+CloudWatch extracts metrics from EMF lines in the function's log stream, so no agent or
+extra service is needed. Values are buffered and written by ``flush()`` at the end of each
+invocation: one line per dimension set, each metric holding all its values in an array
+(CloudWatch keeps every value, so percentiles work). Tests swap ``metrics.sink`` for
+``list.append`` and read the lines back.
+
+- ``StageLatency`` (by ``Stage``): every ``tracing_utils.span``.
+- ``DependencyLatency`` (by ``Dependency``): every AWS SDK call, LLM call and Pinecone query.
+- ``TurnLatency`` / ``TimeToFirstToken``: recorded by the chat handler per turn.
+- ``Compactions`` / ``SummaryDigestTokens`` / ``SummaryTokens``: one value per stored
+  summary compaction.
+"""
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections.abc import Callable
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "MiniMe")
+# CloudWatch accepts at most 100 values per metric in one EMF line.
+EMF_MAX_VALUES = 100
+
+_Dimensions = Tuple[Tuple[str, str], ...]
+
+
+def _stdout(line: str) -> None:
+    # Not through logging: the Lambda log format prefixes records, and EMF lines must be bare JSON.
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+
+class Metrics:
+    def __init__(self, namespace: str = METRICS_NAMESPACE, sink: Callable[[str], None] = _stdout) -> None:
+        self.namespace = namespace
+        self.sink = sink
+        self.service = "minime"
+        self._values: Dict[_Dimensions, Dict[str, Tuple[str, List[float]]]] = {}
+        self._lock = threading.Lock()
+
+    def put(self, name: str, value: float, unit: str = "Milliseconds", **dimensions: str) -> None:
+        key = tuple(sorted(dimensions.items()))
+        with self._lock:
+            _, values = self._values.setdefault(key, {}).setdefault(name, (unit, []))
+            values.append(value)
+            full = len(values) >= EMF_MAX_VALUES
+        if full:
+            self.flush()
+
+    @contextmanager
+    def timer(self, name: str, **dimensions: str):
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.put(name, (perf_counter() - started) * 1000, **dimensions)
+
+    def flush(self) -> None:
+        with self._lock:
+            buffered, self._values = self._values, {}
+        timestamp = int(time.time() * 1000)
+        for key, metrics in buffered.items():
+            dimensions = dict(key)
+            line = {
+                "_aws": {
+                    "Timestamp": timestamp,
+                    "CloudWatchMetrics": [{
+                        "Namespace": self.namespace,
+                        "Dimensions": [["Service", *dimensions]],
+                        "Metrics": [{"Name": name, "Unit": unit} for name, (unit, _) in metrics.items()],
+                    }],
+                },
+                "Service": self.service,
+                **dimensions,
+                **{name: values for name, (_, values) in metrics.items()},
+            }
+            try:
+                self.sink(json.dumps(line))
+            except Exception as e:
+                logger.warning("Failed to write metrics: %s", e)
+
+    def values(self, name: str, **dimensions: str) -> Optional[List[float]]:
+        """Buffered values of one metric, for tests and benchmarks."""
+        with self._lock:
+            entry = self._values.get(tuple(sorted(dimensions.items())), {}).get(name)
+            return list(entry[1]) if entry else None
+
+
+metrics = Metrics()
+
+
+def flushing(handler):
+    """Decorate a Lambda handler so each invocation's metrics are written before it returns."""
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        try:
+            return handler(event, context)
+        finally:
+            metrics.flush()
+
+    return wrapper
+
+
+_botocore_instrumented = False
+
+
+def instrument_botocore() -> None:
+    """Record ``DependencyLatency`` for every AWS SDK call, e.g. ``dynamodb.UpdateItem``.
+
+    Wraps ``BaseClient._make_api_call`` (as the OpenTelemetry instrumentor does) rather than
+    registering client event hooks, so clients created at import time are covered too.
+    Failed calls, such as conditional check failures, are timed as well.
+    """
+    global _botocore_instrumented
+    if _botocore_instrumented:
+        return
+    _botocore_instrumented = True
+    from wrapt import wrap_function_wrapper
+
+    def timed_api_call(wrapped, instance, args, kwargs):
+        operation = args[0] if args else kwargs.get("operation_name", "unknown")
+        dependency = f"{instance.meta.service_model.service_id.hyphenize()}.{operation}"
+        with metrics.timer("DependencyLatency", Dependency=dependency):
+            return wrapped(*args, **kwargs)
+
+    wrap_function_wrapper("botocore.client", "BaseClient._make_api_call", timed_api_call)
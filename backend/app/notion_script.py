@@ -1,57 +1,226 @@
+"""Incrementally sync the Notion knowledge database into the search indexes.
+
+Only pages edited since the last run's watermark are exported (concurrently), and a page
+whose exported content hash is unchanged is not re-upserted. Pages removed from the
+database are deleted from the index. The state file keeps each page's hash and chunks, so
+the BM25 index (and optionally the local vector snapshot) can be rebuilt from the whole
+corpus without exporting it again.
+
+    python notion_script.py [--full] [--workers 4] [--state notion_sync_state.json]
+
+``--package-indexes-only`` exports every page and writes just the packaged indexes,
+without touching Pinecone or the state file; ``build.sh`` runs it so each deployment
+ships a BM25 index built from the current Notion content.
+"""
+import argparse
+import hashlib
+import json
+import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 
 from notion2md.exporter.block import StringExporter
 from notion_client import Client as NotionClient
-from pinecone import Pinecone
-import time
+
+import knowledge.vector_store as vector_store
+from knowledge.bm25 import BM25Index
+from knowledge.chunker import chunk_id, chunk_page
+from knowledge.local_index import build_snapshot
+from knowledge.retrieval_cache import retrieval_cache
+from utils.settings import bool_env, positive_int_env
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 NOTION_API_KEY = os.environ.get("NOTION_API_KEY")
 NOTION_DB_ID = os.environ.get("NOTION_DB_ID")
-PINECONE_API_KEY = os.environ.get("PINECONE_API_KEY")
-INDEX_NAME = "ragtest"
-
-notion = NotionClient(auth=NOTION_API_KEY)
-pc = Pinecone(api_key=PINECONE_API_KEY)
-
-all_pages = []
-next_cursor = None
-while True:
-    response = notion.databases.query(database_id=NOTION_DB_ID, start_cursor=None)
-
-    all_pages.extend(response["results"])
-
-    if response.get("has_more"):
-        next_cursor = response["next_cursor"]
-    else:
-        break
-
-if not pc.has_index(INDEX_NAME):
-    pc.create_index_for_model(
-        name=INDEX_NAME,
-        cloud="aws",
-        region="us-east-1",
-        embed={
-            "model": "llama-text-embed-v2",
-            "field_map": {"text": "text"}
-        }
+NOTION_SYNC_STATE = os.environ.get(
+    "NOTION_SYNC_STATE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "notion_sync_state.json")
+)  # outside app/, so it is not packaged with the Lambda
+# Notion allows about three requests per second per integration; keep the pool small.
+NOTION_EXPORT_WORKERS = positive_int_env("NOTION_EXPORT_WORKERS", 4)
+INDEX_READY_TIMEOUT_SECONDS = 120
+INDEX_READY_POLL_SECONDS = 2
+
+
+@dataclass
+class PageState:
+    title: str
+    hash: str
+    chunks: List[dict]
+
+
+@dataclass
+class SyncState:
+    watermark: Optional[str] = None  # newest last_edited_time already synced
+    pages: Dict[str, PageState] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: str) -> "SyncState":
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            watermark=data.get("watermark"),
+            pages={pid: PageState(**p) for pid, p in data.get("pages", {}).items()},
+        )
+
+    def save(self, path: str) -> None:
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "watermark": self.watermark,
+                "pages": {pid: p.__dict__ for pid, p in self.pages.items()},
+            }, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def records(self) -> List[dict]:
+        return [c for p in self.pages.values() for c in p.chunks]
+
+
+def query_pages(notion: NotionClient, since: Optional[str] = None, **kwargs) -> List[dict]:
+    """All pages of the database, following ``next_cursor``; only those edited at/after ``since`` if given."""
+    if since:
+        kwargs["filter"] = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": since}}
+    pages = []
+    cursor = None
+    while True:
+        response = notion.databases.query(database_id=NOTION_DB_ID, start_cursor=cursor, page_size=100, **kwargs)
+        pages.extend(response["results"])
+        if not response.get("has_more"):
+            return pages
+        cursor = response["next_cursor"]
+
+
+def page_title(page: dict) -> str:
+    parts = page["properties"]["Title"]["title"]
+    return "".join(p["plain_text"] for p in parts) or "Untitled"
+
+
+def export_markdown(page_id: str) -> str:
+    return StringExporter(block_id=page_id, token=NOTION_API_KEY).export()
+
+
+def content_hash(title: str, markdown: str) -> str:
+    return hashlib.sha256(f"{title}\n{markdown}".encode("utf-8")).hexdigest()
+
+
+def wait_until_indexed(expected: int) -> None:
+    """Poll index stats until the namespace holds ``expected`` records (upserts are eventually consistent)."""
+    deadline = time.monotonic() + INDEX_READY_TIMEOUT_SECONDS
+    index = vector_store.pinecone_index()
+    while True:
+        stats = index.describe_index_stats()
+        namespace = stats.namespaces.get(vector_store.NAMESPACE)
+        count = namespace.vector_count if namespace else 0
+        if count == expected:
+            logger.info("Index ready: %d records in '%s'", count, vector_store.NAMESPACE)
+            return
+        if time.monotonic() >= deadline:
+            logger.warning("Index still at %d records (expected %d) after %ds", count, expected, INDEX_READY_TIMEOUT_SECONDS)
+            return
+        time.sleep(INDEX_READY_POLL_SECONDS)
+
+
+def sync(state: SyncState, full: bool = False, workers: int = NOTION_EXPORT_WORKERS) -> bool:
+    """Bring the indexes up to date with Notion. Returns whether anything changed."""
+    notion = NotionClient(auth=NOTION_API_KEY)
+    started = time.monotonic()
+
+    changed = query_pages(notion, since=None if full else state.watermark)
+    # Listing ids without properties is cheap next to exporting; it is how deletions are found.
+    live_ids = {p["id"] for p in query_pages(notion, filter_properties=[])}
+    logger.info("%d pages edited since %s, %d pages live", len(changed), state.watermark, len(live_ids))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        exported = list(pool.map(lambda p: export_markdown(p["id"]), changed))
+
+    upserts, deletes = [], []
+    for page, markdown in zip(changed, exported):
+        page_id, title = page["id"], page_title(page)
+        digest = content_hash(title, markdown)
+        previous = state.pages.get(page_id)
+        if previous is not None and previous.hash == digest:
+            continue
+
+        chunks = chunk_page(page_id, title, markdown)
+        upserts.extend(chunks)
+        if previous is None:
+            # Unknown to the state file: may still have records from before incremental sync.
+            kept = {c["id"] for c in chunks}
+            deletes.extend(i for i in vector_store.list_record_ids(page_id) if i not in kept)
+        else:
+            deletes.extend(chunk_id(page_id, n) for n in range(len(chunks), len(previous.chunks)))
+        state.pages[page_id] = PageState(title=title, hash=digest, chunks=chunks)
+        logger.info("Changed: %s (%d chunks)", title, len(chunks))
+
+    for page_id in set(state.pages) - live_ids:
+        removed = state.pages.pop(page_id)
+        deletes.extend(c["id"] for c in removed.chunks)
+        logger.info("Removed: %s", removed.title)
+
+    if changed:
+        state.watermark = max([p["last_edited_time"] for p in changed] + [state.watermark or ""])
+
+    if not upserts and not deletes:
+        logger.info("No content changes (%.1fs)", time.monotonic() - started)
+        return False
+
+    vector_store.upsert_records(upserts)
+    vector_store.delete_records(deletes)
+    wait_until_indexed(len(state.records()))
+
+    build_package_indexes(state.records())
+
+    # Cached search results and answers refer to the old content; make them unreachable.
+    retrieval_cache.invalidate()
+    logger.info(
+        "Synced %d upserts, %d deletes, %d pages in %.1fs",
+        len(upserts), len(deletes), len(state.pages), time.monotonic() - started,
     )
+    return True
 
-records = []
-for page in all_pages:
-    page_id = page["id"]
-    page_title = page["properties"]["Title"]["title"][0]["plain_text"]
-    exporter = StringExporter(block_id=page_id, token=NOTION_API_KEY)
-    markdown = exporter.export()
 
-    records.append({"id": page_id, "title": page_title, "text": markdown})
-    print(page_title)
+def build_package_indexes(records: List[dict]) -> None:
+    """Write the indexes shipped in the Lambda package: BM25, and the vector snapshot if enabled."""
+    BM25Index.build(records).save()
+    if bool_env("BUILD_LOCAL_INDEX", False):
+        build_snapshot(records)
+
+
+def export_all(workers: int = NOTION_EXPORT_WORKERS) -> List[dict]:
+    """Chunk every live page, for builds that have no sync state; Pinecone is not touched."""
+    pages = query_pages(NotionClient(auth=NOTION_API_KEY))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        exported = list(pool.map(lambda p: export_markdown(p["id"]), pages))
+    records = [c for page, markdown in zip(pages, exported) for c in chunk_page(page["id"], page_title(page), markdown)]
+    logger.info("Exported %d pages, %d chunks", len(pages), len(records))
+    return records
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sync the Notion knowledge base into the search indexes.")
+    parser.add_argument("--full", action="store_true", help="ignore the watermark and re-check every page")
+    parser.add_argument("--workers", type=int, default=NOTION_EXPORT_WORKERS, help="concurrent page exports")
+    parser.add_argument("--state", default=NOTION_SYNC_STATE, help="sync state file")
+    parser.add_argument(
+        "--package-indexes-only", action="store_true",
+        help="only build the packaged indexes from a full export (used by build.sh)",
+    )
+    args = parser.parse_args()
 
-dense_index = pc.Index(INDEX_NAME)
+    if args.package_indexes_only:
+        build_package_indexes(export_all(args.workers))
+        return
 
-dense_index.upsert_records("test", records)
+    state = SyncState.load(args.state)
+    sync(state, full=args.full, workers=args.workers)
+    state.save(args.state)
 
-time.sleep(10)
 
-# View stats for the index
-stats = dense_index.describe_index_stats()
-print(stats)
+if __name__ == "__main__":
+    main()
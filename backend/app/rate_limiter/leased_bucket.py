@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from rate_limiter.token_bucket import BucketContended, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LeaseConfig:
+    lease_size: int = 3  # tokens taken from DynamoDB per lease
+    lease_seconds: float = 30.0  # unused tokens are given back after this long
+    max_overshoot: int = 1  # requests a container may admit per bucket while DynamoDB is unreachable
+    leases_per_burst: int = 3  # a lease is at most burst_size // leases_per_burst tokens
+
+
+@dataclass
+class _Lease:
+    tokens: float
+    expires_at: float
+    debt: float = 0.0  # requests admitted on credit, charged to the next lease
+
+
+class LeasedTokenBucket:
+    """Two-tier limiter: leases small token batches from a ``TokenBucket`` and spends them locally.
+
+    Only taking a new lease touches DynamoDB on the request path, so repeated checks for the
+    same bucket in a warm container are served from memory; expired leases are returned by a
+    background thread. Leased tokens are already deducted globally, so leasing never admits
+    more than the bucket allows; the only overshoot is ``max_overshoot`` requests per container
+    and bucket admitted on credit while DynamoDB is failing, which are charged back on the
+    next successful lease.
+
+    A frozen container cannot return its leases, so a lease is capped at a share of the burst
+    (``leases_per_burst``): containers holding stale leases never hold a visitor's whole budget.
+    """
+
+    def __init__(self, bucket: TokenBucket, config: Optional[LeaseConfig] = None) -> None:
+        self.bucket = bucket
+        self.config = config or LeaseConfig()
+        self.lease_size = max(1, min(self.config.lease_size, bucket.capacity // self.config.leases_per_burst))
+        self._leases: Dict[str, _Lease] = {}
+        self._lock = threading.Lock()
+        self._returns: Optional[ThreadPoolExecutor] = None
+
+    def should_throttle(self, bucket_id: str, cost: float = 1) -> bool:
+        now = time.time()
+        expired = self._take_expired(now)
+        if expired:
+            self._return_executor().submit(self._return, expired)
+
+        with self._lock:
+            lease = self._leases.get(bucket_id)
+            if lease is not None and lease.tokens >= cost:
+                lease.tokens -= cost
+                return False
+
+        return self._renew(bucket_id, cost, now)
+
+    def release_all(self) -> None:
+        """Give back every unused leased token (e.g. before a container is retired)."""
+        self._return(self._take_expired(float("inf")))
+
+    def _renew(self, bucket_id: str, cost: float, now: float) -> bool:
+        with self._lock:
+            lease = self._leases.pop(bucket_id, None) or _Lease(tokens=0.0, expires_at=0.0)
+
+        # Whatever is left of the old lease goes towards this request; debt from an outage is settled now.
+        owed = cost - lease.tokens + lease.debt
+        try:
+            granted = self.bucket.acquire(bucket_id, want=max(self.lease_size, owed), minimum=owed)
+        except BucketContended:
+            logger.warning("Rate limit bucket %s is contended, throttling", bucket_id)
+            self._keep(bucket_id, lease)
+            return True
+        except Exception as e:
+            return self._on_credit(bucket_id, lease, cost, e)
+
+        if granted < owed:
+            self._keep(bucket_id, lease)
+            return True
+
+        self._keep(bucket_id, _Lease(tokens=granted - owed, expires_at=now + self.config.lease_seconds))
+        return False
+
+    def _on_credit(self, bucket_id: str, lease: _Lease, cost: float, error: Exception) -> bool:
+        if lease.debt + cost > self.config.max_overshoot:
+            logger.warning("Rate limiter unavailable for %s and overshoot budget spent, throttling: %s", bucket_id, error)
+            self._keep(bucket_id, lease)
+            return True
+        logger.warning("Rate limiter unavailable for %s, admitting on credit: %s", bucket_id, error)
+        lease.debt += cost
+        self._keep(bucket_id, lease)
+        return False
+
+    def _keep(self, bucket_id: str, lease: _Lease) -> None:
+        if lease.tokens > 0 or lease.debt > 0:
+            with self._lock:
+                self._leases[bucket_id] = lease
+
+    def _take_expired(self, now: float) -> List[Tuple[str, _Lease]]:
+        with self._lock:
+            expired = [(b, l) for b, l in self._leases.items() if l.expires_at <= now and l.debt == 0]
+            for bucket_id, _ in expired:
+                del self._leases[bucket_id]
+        return [(b, l) for b, l in expired if l.tokens > 0]
+
+    def _return_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._returns is None:
+                self._returns = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lease-return")
+            return self._returns
+
+    def _return(self, expired: List[Tuple[str, _Lease]]) -> None:
+        for bucket_id, lease in expired:
+            try:
+                self.bucket.release(bucket_id, lease.tokens)
+            except Exception as e:
+                # Not fatal: the bucket refills on its own, the tokens are just unavailable until then.
+                logger.warning("Failed to return %.2f leased tokens to %s: %s", lease.tokens, bucket_id, e)
@@ -0,0 +1,152 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from rate_limiter.token_bucket import BucketContended, TokenBucket, TokenBucketConfig
+from utils.settings import positive_float_env, positive_int_env
+
+logger = logging.getLogger(__name__)
+
+SPEND_TOKENS_PER_MINUTE = positive_int_env("SPEND_TOKENS_PER_MINUTE", 30_000)
+SPEND_BURST_TOKENS = positive_int_env("SPEND_BURST_TOKENS", 90_000)
+# Output tokens are priced several times higher than input tokens; charge them accordingly.
+SPEND_OUTPUT_WEIGHT = positive_float_env("SPEND_OUTPUT_WEIGHT", 5.0)
+# Prompt-cache reads are billed at a tenth of the input price and cache writes at 1.25x.
+SPEND_CACHE_READ_WEIGHT = positive_float_env("SPEND_CACHE_READ_WEIGHT", 0.1)
+SPEND_CACHE_WRITE_WEIGHT = positive_float_env("SPEND_CACHE_WRITE_WEIGHT", 1.25)
+
+
+class SpendLimitExceeded(Exception):
+    """The turn's estimated LLM spend does not fit in the caller's budget."""
+
+
+@dataclass
+class SpendLimiterConfig:
+    tokens_per_minute: int = SPEND_TOKENS_PER_MINUTE
+    burst_tokens: int = SPEND_BURST_TOKENS
+    output_weight: float = SPEND_OUTPUT_WEIGHT
+    cache_read_weight: float = SPEND_CACHE_READ_WEIGHT
+    cache_write_weight: float = SPEND_CACHE_WRITE_WEIGHT
+    table_name: str = "RateLimitBuckets"
+
+
+@dataclass
+class TokenUsage:
+    input_tokens: int = 0  # uncached input only; cached prefix tokens are counted below
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+
+    def __add__(self, other: "TokenUsage") -> "TokenUsage":
+        return TokenUsage(
+            self.input_tokens + other.input_tokens,
+            self.output_tokens + other.output_tokens,
+            self.cache_read_tokens + other.cache_read_tokens,
+            self.cache_write_tokens + other.cache_write_tokens,
+        )
+
+    @classmethod
+    def from_replies(cls, messages) -> "TokenUsage":
+        """Sum the usage both Anthropic and Bedrock generators report on each reply's meta.
+
+        Anthropic's prompt tokens exclude the prefix read from or written to the prompt cache.
+        """
+        usage = cls()
+        for m in messages:
+            usage += cls.from_meta(m.meta.get("usage") or {})
+        return usage
+
+    @classmethod
+    def from_meta(cls, reported: Dict) -> "TokenUsage":
+        """One reply's ``usage`` meta."""
+        return cls(
+            input_tokens=int(reported.get("prompt_tokens") or 0),
+            output_tokens=int(reported.get("completion_tokens") or 0),
+            cache_read_tokens=int(reported.get("cache_read_input_tokens") or 0),
+            cache_write_tokens=int(reported.get("cache_creation_input_tokens") or 0),
+        )
+
+
+class SpendLimiter:
+    """Charges LLM token spend against per-key buckets, in input-token equivalents.
+
+    A turn reserves a pre-estimate on every key before it starts and settles the
+    difference with the usage the model reported once it is done. A turn that ran over
+    its estimate pushes the buckets into debt, so the next turns wait for the refill.
+    """
+
+    def __init__(self, config: SpendLimiterConfig = SpendLimiterConfig()) -> None:
+        self.config = config
+        self.bucket = TokenBucket(TokenBucketConfig(
+            rate_per_minute=config.tokens_per_minute,
+            burst_size=config.burst_tokens,
+            table_name=config.table_name,
+        ))
+
+    def cost(self, usage: TokenUsage) -> float:
+        return (
+            usage.input_tokens
+            + usage.output_tokens * self.config.output_weight
+            + usage.cache_read_tokens * self.config.cache_read_weight
+            + usage.cache_write_tokens * self.config.cache_write_weight
+        )
+
+    def account(self, *keys: str) -> "SpendAccount":
+        """Budget for one turn, charged to every non-empty key (e.g. session and IP)."""
+        return SpendAccount(self, [f"spend#{k}" for k in keys if k])
+
+
+@dataclass
+class SpendAccount:
+    limiter: SpendLimiter
+    keys: List[str]
+    reserved: Dict[str, float] = field(default_factory=dict)
+
+    def reserve(self, estimate: TokenUsage) -> None:
+        """Take the estimated cost from every key or raise ``SpendLimitExceeded`` and take nothing."""
+        amount = self.limiter.cost(estimate)
+        bucket = self.limiter.bucket
+        for key in self.keys:
+            try:
+                granted = bucket.acquire(key, want=amount, minimum=amount)
+            except BucketContended:
+                granted = 0.0
+            except Exception as e:
+                logger.warning("Spend limiter unavailable for %s, allowing turn: %s", key, e)
+                self.reserved[key] = 0.0
+                continue
+
+            if granted < amount:
+                self._refund()
+                raise SpendLimitExceeded(f"{key} cannot cover an estimated {amount:.0f} tokens")
+            self.reserved[key] = granted
+
+    def settle(self, usage: TokenUsage) -> None:
+        """Replace the reservation with the actual cost reported by the model."""
+        actual = self.limiter.cost(usage)
+        bucket = self.limiter.bucket
+        for key, reserved in self.reserved.items():
+            delta = actual - reserved
+            try:
+                if delta > 0:
+                    bucket.charge(key, delta)
+                elif delta < 0:
+                    bucket.release(key, -delta)
+            except Exception as e:
+                logger.warning("Failed to settle spend for %s (delta %.0f): %s", key, delta, e)
+        logger.info(
+            "Turn spend: input=%d output=%d cache_read=%d cache_write=%d cost=%.0f keys=%s",
+            usage.input_tokens, usage.output_tokens, usage.cache_read_tokens, usage.cache_write_tokens,
+            actual, list(self.reserved),
+        )
+        self.reserved = {}
+
+    def _refund(self) -> None:
+        for key, reserved in self.reserved.items():
+            if reserved <= 0:
+                continue
+            try:
+                self.limiter.bucket.release(key, reserved)
+            except Exception as e:
+                logger.warning("Failed to refund spend reservation for %s: %s", key, e)
+        self.reserved = {}
@@ -1,8 +1,25 @@
+import logging
+import threading
 import time
+from collections import OrderedDict
 from dataclasses import dataclass
+from decimal import Decimal
+from typing import Callable, Optional, Tuple, TypeVar
 
 import boto3
+from boto3.dynamodb.types import TypeDeserializer
 from botocore.config import Config
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+_deserializer = TypeDeserializer()
+
+T = TypeVar("T")
+
+
+class BucketContended(Exception):
+    """Every conditional write attempt lost to another caller."""
 
 
 @dataclass
@@ -10,42 +27,143 @@ class TokenBucketConfig:
     rate_per_minute: int
     burst_size: int
     table_name: str = "RateLimitBuckets"
+    max_attempts: int = 3  # conditional-write retries when another caller moved the bucket
+    known_buckets: int = 1024  # buckets whose last-seen state is remembered locally
 
 
 class TokenBucket:
-    """Simple DynamoDB token bucket."""
+    """DynamoDB token bucket updated with a single conditional ``UpdateItem`` per check.
+
+    DynamoDB expressions cannot clamp the refill at ``capacity``, so the refill is computed
+    here from the last state this container saw and written with a compare-and-set on
+    ``last_updated``. When another caller moved the bucket first, the failed write returns
+    the current item and the check is retried against it. Throttle decisions are made
+    without writing. Items carry an ``expires_at`` TTL set to when they would be full again.
+    """
 
     def __init__(self, config: TokenBucketConfig) -> None:
         self.rate = config.rate_per_minute
         self.capacity = config.burst_size
         self.interval = 60
+        self.max_attempts = config.max_attempts
+        self.known_buckets = config.known_buckets
         self.table = boto3.resource("dynamodb", config=Config(retries={"max_attempts": 1})).Table(config.table_name)
+        self._seen: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def full_refill_seconds(self) -> float:
+        return self.capacity * self.interval / self.rate
 
-    def should_throttle(self, bucket_id: str) -> bool:
-        now = int(time.time())
+    def should_throttle(self, bucket_id: str, cost: float = 1) -> bool:
         try:
-            resp = self.table.get_item(Key={"bucket_id": bucket_id})
-            item = resp.get("Item", {})
-        except Exception:
-            item = {}
+            return self._update(bucket_id, lambda tokens: (tokens - cost, False) if tokens >= cost else (None, True))
+        except BucketContended:
+            logger.warning("Rate limit bucket %s is contended, throttling", bucket_id)
+            return True
+        except Exception as e:
+            logger.warning("Rate limiter unavailable for %s, allowing request: %s", bucket_id, e)
+            return False
+
+    def acquire(self, bucket_id: str, want: float, minimum: float = 1) -> float:
+        """Take up to ``want`` tokens (at least ``minimum``, else none) and return how many were taken.
+
+        Unlike ``should_throttle`` errors propagate, so callers can decide how to degrade.
+        """
+        def take(tokens: float):
+            if tokens < minimum:
+                return None, 0.0
+            granted = min(want, tokens)
+            return tokens - granted, granted
+
+        return self._update(bucket_id, take)
 
-        tokens = item.get("token_count", self.capacity)
-        last_updated = item.get("last_updated", now)
+    def release(self, bucket_id: str, amount: float) -> None:
+        """Give back tokens taken by ``acquire`` and not used (never above capacity)."""
+        self._update(
+            bucket_id,
+            lambda tokens: (None, None) if tokens >= self.capacity else (min(self.capacity, tokens + amount), None),
+        )
 
-        # refill tokens based on elapsed time
-        elapsed = now - last_updated
-        tokens = min(self.capacity, tokens + (elapsed * self.rate) // self.interval)
+    def charge(self, bucket_id: str, amount: float) -> None:
+        """Deduct ``amount`` unconditionally; the bucket may go negative and then refills from debt."""
+        self._update(bucket_id, lambda tokens: (tokens - amount, None))
 
-        if tokens <= 0:
-            new_tokens = tokens
-            throttle = True
+    def _update(self, bucket_id: str, apply: Callable[[float], Tuple[Optional[float], T]]) -> T:
+        """Run ``apply`` on the refilled token count and store its result with a CAS write.
+
+        ``apply`` returns ``(new_tokens, result)``; ``new_tokens=None`` means nothing to write.
+        """
+        seen = self._recall(bucket_id)
+        for _ in range(self.max_attempts):
+            now = time.time()
+            if seen is None:
+                tokens, expected_last = float(self.capacity), None
+            else:
+                tokens = self._refill(*seen, now)
+                expected_last = seen[1]
+
+            new_tokens, result = apply(tokens)
+            if new_tokens is None:
+                return result
+
+            ok, current = self._write(bucket_id, new_tokens, now, expected_last)
+            if ok:
+                self._remember(bucket_id, (new_tokens, now))
+                return result
+            seen = current
+
+        raise BucketContended(f"bucket {bucket_id} changed {self.max_attempts} times during one update")
+
+    def _refill(self, tokens: float, last_updated: float, now: float) -> float:
+        elapsed = max(0.0, now - last_updated)
+        return min(float(self.capacity), tokens + elapsed * self.rate / self.interval)
+
+    def _write(
+            self, bucket_id: str, tokens: float, now: float, expected_last: Optional[float]
+    ) -> Tuple[bool, Optional[Tuple[float, float]]]:
+        """Conditionally store the new state; on conflict return the state that won."""
+        values = {
+            ":tokens": _decimal(tokens),
+            ":now": _decimal(now),
+            ":expires": int(now + self.full_refill_seconds) + self.interval,
+        }
+        if expected_last is None:
+            # Treat an unseen bucket as full; valid only if it is absent or has had time to refill.
+            condition = "attribute_not_exists(bucket_id) OR last_updated <= :full_since"
+            values[":full_since"] = _decimal(now - self.full_refill_seconds)
         else:
-            new_tokens = tokens - 1
-            throttle = False
+            condition = "last_updated = :expected"
+            values[":expected"] = _decimal(expected_last)
 
         try:
-            self.table.put_item(Item={"bucket_id": bucket_id, "token_count": int(new_tokens), "last_updated": now})
-        except Exception:
-            pass
+            self.table.update_item(
+                Key={"bucket_id": bucket_id},
+                UpdateExpression="SET token_count = :tokens, last_updated = :now, expires_at = :expires",
+                ConditionExpression=condition,
+                ExpressionAttributeValues=values,
+                ReturnValuesOnConditionCheckFailure="ALL_OLD",
+            )
+            return True, None
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+            item = {k: _deserializer.deserialize(v) for k, v in e.response.get("Item", {}).items()}
+            if "last_updated" not in item:
+                return False, None
+            return False, (float(item.get("token_count", 0)), float(item["last_updated"]))
+
+    def _recall(self, bucket_id: str) -> Optional[Tuple[float, float]]:
+        with self._lock:
+            return self._seen.get(bucket_id)
+
+    def _remember(self, bucket_id: str, state: Tuple[float, float]) -> None:
+        with self._lock:
+            self._seen[bucket_id] = state
+            self._seen.move_to_end(bucket_id)
+            while len(self._seen) > self.known_buckets:
+                self._seen.popitem(last=False)
+
 
-        return throttle
+def _decimal(value: float) -> Decimal:
+    return Decimal(repr(round(value, 6)))
@@ -5,6 +5,7 @@ from datetime import datetime, timedelta
 from uuid import uuid4
 
 from tracing import tracer
+from utils import resources
 
 from google.oauth2 import service_account
 from google.auth.transport.requests import AuthorizedSession
@@ -19,6 +20,10 @@ logger.setLevel(logging.INFO)
 
 
 def _authorized_session() -> AuthorizedSession:
+    return resources.get_or_create(("google", "calendar_session"), _build_authorized_session)
+
+
+def _build_authorized_session() -> AuthorizedSession:
     if not SERVICE_ACCOUNT_JSON:
         raise RuntimeError("Missing GOOGLE_SERVICE_ACCOUNT (service account JSON).")
     if not IMPERS_USER:
@@ -86,6 +91,8 @@ def schedule_meeting(
         resp = authed.post(url, json=body)
 
         if not resp.ok:
+            if resp.status_code == 401:
+                resources.invalidate("google")
             raise RuntimeError(f"Calendar API error {resp.status_code}: {resp.text}")
 
         event = resp.json()
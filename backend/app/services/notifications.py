@@ -52,3 +52,22 @@ def send_conversation_start_event(
         logger.info("Sent conversation start event for %s", session_id)
     except Exception as exc:
         logger.warning("Failed to put EventBridge event: %s", exc)
+
+
+def send_summary_compaction_event(session_id: str) -> None:
+    """Emit an EventBridge event asking the worker to fold old messages into the summary."""
+    bus_name = os.environ.get("EVENT_BUS_NAME", "default")
+    try:
+        _eventbridge.put_events(
+            Entries=[
+                {
+                    "EventBusName": bus_name,
+                    "Source": "minime.chat",
+                    "DetailType": "SummaryCompactionRequested",
+                    "Detail": json.dumps({"session_id": session_id}),
+                }
+            ]
+        )
+        logger.info("Sent summary compaction event for %s", session_id)
+    except Exception as exc:
+        logger.warning("Failed to put EventBridge event: %s", exc)
@@ -0,0 +1,34 @@
+import json
+import logging
+
+from memory.compaction import compact_session
+from metrics import flushing
+from tracing import init_tracing, tracer
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+init_tracing("summary_compaction_handler")
+
+
+@flushing
+def handler(event, context):
+    """Fold old messages of a session into its running summary."""
+    with tracer.start_as_current_span("handler"):
+        records = event.get("Records", [])
+        if not records:
+            logger.warning("No records in event: %s", event)
+            return {"statusCode": 400}
+
+        try:
+            payload = json.loads(records[0]["body"])
+        except Exception as exc:
+            logger.warning("Failed to parse SQS message: %s", exc)
+            return {"statusCode": 400}
+
+        session_id = payload.get("detail", {}).get("session_id")
+        if not session_id:
+            logger.warning("Event missing session_id: %s", payload)
+            return {"statusCode": 400}
+
+        compact_session(session_id)
+        return {"statusCode": 200}
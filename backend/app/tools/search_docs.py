@@ -1,23 +1,37 @@
-from typing import Annotated
+from typing import Annotated, Optional
 
 from haystack import Pipeline
 from haystack.tools import tool
 
+from components.context_packer import ContextPacker
 from components.pinecone_retriever import PineconeRetriever
 from components.rag_query_rewriter import RagQueryRewriter
+from knowledge.prefetch import Prefetch
+from utils import resources
 
+SEARCH_TOP_K = 40
+SEARCH_TOP_N = 20
 
-def make_search_docs(session_id, memory_snapshot):
+
+def _build_rag_pipeline() -> Pipeline:
+    rag_pipeline = Pipeline()
+    rag_pipeline.add_component("rag_query_rewriter", RagQueryRewriter())
+    rag_pipeline.add_component("pinecone_retriever", PineconeRetriever())
+    rag_pipeline.add_component("context_packer", ContextPacker())
+
+    rag_pipeline.connect("rag_query_rewriter.search_query", "pinecone_retriever.search_query")
+    rag_pipeline.connect("rag_query_rewriter.search_query", "context_packer.search_query")
+    rag_pipeline.connect("pinecone_retriever.results", "context_packer.results")
+    return rag_pipeline
+
+
+def make_search_docs(session_id, memory_snapshot, prefetch: Optional[Prefetch] = None):
     @tool(name="search_docs",
           description="Retrieve relevant documents/snippets from the KB")
     def search_docs(
             query: Annotated[str, "Query to Search"],
     ) -> str:
-        rag_pipeline = Pipeline()
-        rag_pipeline.add_component("rag_query_rewriter", RagQueryRewriter())
-        rag_pipeline.add_component("pinecone_retriever", PineconeRetriever())
-
-        rag_pipeline.connect("rag_query_rewriter.search_query", "pinecone_retriever.search_query")
+        rag_pipeline = resources.get_or_create(("pipeline", "rag"), _build_rag_pipeline)
 
         return rag_pipeline.run(
             data={
@@ -28,9 +42,13 @@ def make_search_docs(session_id, memory_snapshot):
                 },
                 "pinecone_retriever": {
                     "session_id": session_id,
-                    "top_k": 40,
-                    "top_n": 20,
+                    "top_k": SEARCH_TOP_K,
+                    "top_n": SEARCH_TOP_N,
+                    "prefetch": prefetch,
+                },
+                "context_packer": {
+                    "session_id": session_id,
                 }
-            })["pinecone_retriever"]["documents"]
+            })["context_packer"]["documents"]
 
     return search_docs
@@ -2,18 +2,22 @@ import logging
 from opentelemetry import trace
 from opentelemetry.instrumentation.botocore import BotocoreInstrumentor
 
+from metrics import instrument_botocore, metrics
+
 logger = logging.getLogger(__name__)
 _initialized = False
 
 
 def init_tracing(service_name: str = "minime") -> None:
-    """Initialize OpenTelemetry tracing if not already configured."""
+    """Initialize OpenTelemetry tracing and EMF metrics if not already configured."""
     global _initialized
     if _initialized:
         return
     _initialized = True
+    metrics.service = service_name
     try:
         BotocoreInstrumentor().instrument()
+        instrument_botocore()
         logger.info("Tracing initialised")
     except Exception as exc:
         logger.warning("Tracing setup failed: %s", exc)
@@ -1,4 +1,7 @@
 from contextlib import contextmanager
+from time import perf_counter
+
+from metrics import metrics
 from tracing import tracer
 
 
@@ -8,7 +11,12 @@ def log_ctx(**kw):
 
 @contextmanager
 def span(name: str, **attrs):
+    """A tracing span whose duration is also recorded as the ``StageLatency`` metric of ``name``."""
+    started = perf_counter()
     with tracer.start_as_current_span(name) as s:
         for k, v in attrs.items():
             s.set_attribute(k, v)
-        yield
+        try:
+            yield s
+        finally:
+            metrics.put("StageLatency", (perf_counter() - started) * 1000, Stage=name)
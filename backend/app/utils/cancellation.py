@@ -0,0 +1,55 @@
+import logging
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class TurnCancelled(Exception):
+    """Raised when a chat turn is abandoned because the client went away."""
+
+
+class CancellationToken:
+    """Cooperative cancellation signal shared by the messenger thread and the chat turn.
+
+    ``probe`` is an optional check against shared state (e.g. the connection registry).
+    ``is_cancelled`` polls it at most once every ``poll_interval`` seconds; call it only at
+    step boundaries (before model and tool calls). Hot paths such as per-chunk streaming
+    callbacks use ``is_set``/``raise_if_set``, which never do I/O.
+    """
+
+    def __init__(self, probe: Callable[[], bool] | None = None, poll_interval: float = 2.0) -> None:
+        self._event = threading.Event()
+        self._probe = probe
+        self._poll_interval = poll_interval
+        self._last_poll = time.monotonic()
+        self.reason: str | None = None
+
+    def cancel(self, reason: str) -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def is_set(self) -> bool:
+        return self._event.is_set()
+
+    def is_cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self._probe is not None and time.monotonic() - self._last_poll >= self._poll_interval:
+            self._last_poll = time.monotonic()
+            try:
+                if self._probe():
+                    self.cancel("connection marked disconnected")
+            except Exception as e:
+                logger.warning("Cancellation probe failed: %s", e)
+        return self._event.is_set()
+
+    def raise_if_set(self) -> None:
+        if self._event.is_set():
+            raise TurnCancelled(self.reason)
+
+    def raise_if_cancelled(self) -> None:
+        if self.is_cancelled():
+            raise TurnCancelled(self.reason)
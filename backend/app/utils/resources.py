@@ -0,0 +1,55 @@
+"""Process-wide cache of expensive objects reused across warm Lambda invocations.
+
+Objects are keyed by a tuple whose first element names the kind of resource,
+e.g. ``("boto3", "apigatewaymanagementapi", endpoint_url)``.
+"""
+import logging
+import threading
+from typing import Any, Callable, Hashable, TypeVar
+
+import boto3
+from botocore.config import Config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_BOTO_CONFIG = Config(tcp_keepalive=True, max_pool_connections=20)
+
+_lock = threading.RLock()
+_resources: dict[Hashable, Any] = {}
+
+
+def get_or_create(key: Hashable, factory: Callable[[], T]) -> T:
+    """Return the cached object for ``key``, building it with ``factory`` on first use."""
+    try:
+        return _resources[key]
+    except KeyError:
+        pass
+
+    with _lock:
+        if key not in _resources:
+            logger.info("Building resource %s", key)
+            _resources[key] = factory()
+        return _resources[key]
+
+
+def invalidate(kind: Hashable | None = None) -> None:
+    """Drop cached objects.
+
+    With no argument everything is dropped. Otherwise drops the entry equal to ``kind``
+    and every tuple key whose first element is ``kind``.
+    """
+    with _lock:
+        if kind is None:
+            _resources.clear()
+            return
+        for key in list(_resources):
+            if key == kind or (isinstance(key, tuple) and key and key[0] == kind):
+                del _resources[key]
+
+
+def boto3_client(service_name: str, **kwargs):
+    """Shared boto3 client with keep-alive connection pooling."""
+    key = ("boto3", service_name, tuple(sorted(kwargs.items())))
+    return get_or_create(key, lambda: boto3.client(service_name, config=_BOTO_CONFIG, **kwargs))
@@ -0,0 +1,51 @@
+"""Helpers for reading tuning knobs from the environment without crashing on bad values."""
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def bool_env(name: str, default: bool) -> bool:
+    raw = os.environ.get(name)
+    if raw is None:
+        return default
+    return raw.strip().lower() in ("1", "true", "yes", "on")
+
+
+def positive_int_env(name: str, default: int) -> int:
+    """Read a positive integer, falling back to ``default`` when unset or invalid."""
+    return _int_env(name, default, minimum=1)
+
+
+def non_negative_int_env(name: str, default: int) -> int:
+    """Read an integer that may be 0, falling back to ``default`` when unset or invalid."""
+    return _int_env(name, default, minimum=0)
+
+
+def _int_env(name: str, default: int, minimum: int) -> int:
+    raw = os.environ.get(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        value = minimum - 1
+    if value < minimum:
+        logger.warning("Invalid %s=%r, using default %s", name, raw, default)
+        return default
+    return value
+
+
+def positive_float_env(name: str, default: float) -> float:
+    """Read a positive float, falling back to ``default`` when unset or invalid."""
+    raw = os.environ.get(name)
+    if raw is None:
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        value = 0.0
+    if value <= 0:
+        logger.warning("Invalid %s=%r, using default %s", name, raw, default)
+        return default
+    return value
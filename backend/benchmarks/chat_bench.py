@@ -0,0 +1,565 @@
+"""End-to-end load and latency benchmark for ``chat_handler.handler``, fully offline.
+
+Drives the handler with synthetic WebSocket message events against local stand-ins:
+
+- DynamoDB (conversations, rate limit buckets, knowledge cache): moto, or DynamoDB Local
+  with ``--endpoint-url``;
+- API Gateway management endpoint: a fake client that records ``post_to_connection``;
+- Anthropic: the real ``AnthropicChatGenerator`` fed by a scripted stream (a
+  ``search_docs`` tool call, then the answer), with configurable time to first token and
+  token rate;
+- Bedrock (router classifier, small talk, summary compaction) and Pinecone: fakes with
+  configurable latency.
+
+The fakes are installed through ``utils.resources``, the same registry the app builds its
+clients in. Turn latency is measured around each handler call. Time to first token,
+DynamoDB calls and LLM calls come from the handler's own EMF metric lines. Results are
+saved as JSON so runs can be compared with ``--compare``.
+
+Scenarios are ``single``, ``session-<turns>`` and ``concurrent-<sessions>x<turns>``.
+Request and spend limits are lifted so every turn takes the full path; 429s are counted.
+
+    python backend/benchmarks/chat_bench.py [--scenarios single,session-20,session-200,concurrent-8x10]
+        [--latency-scale 0.1] [--endpoint-url http://localhost:8000] [--compare results/<file>.json]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DEFAULT_SCENARIOS = "single,session-20,session-200,concurrent-8x10"
+ENDPOINT_URL = "https://bench.execute-api.eu-west-1.amazonaws.com"
+
+TOPICS = [
+    "kafka", "terraform", "serverless", "dynamodb", "kubernetes", "java", "observability",
+    "distributed", "caching", "payments", "streaming", "graphql", "lambda", "postgres",
+]
+FILLER = (
+    "built designed migrated scaled operated team service latency throughput platform "
+    "pipeline project production incident architecture tradeoff cost reliability"
+).split()
+KNOWLEDGE_TEMPLATES = [
+    "What did you build with {topic}?",
+    "How did you use {topic} in production?",
+    "Tell me about your experience with {topic} and {other}?",
+    "Why did you pick {topic} over {other}?",
+]
+SMALL_TALK = ["hi!", "thanks a lot!", "ok cool", "Hi, I'm Ana from Acme"]
+TIME_QUESTIONS = ["what time is it in Lisbon?", "What's the current time in New York?"]
+
+
+@dataclass
+class FakeLatency:
+    """Milliseconds (and tokens per second) of the fake dependencies, before ``scale``."""
+    llm_ttft_ms: float = 500.0
+    llm_tokens_per_second: float = 80.0
+    llm_output_tokens: int = 80
+    bedrock_ms: float = 300.0
+    pinecone_ms: float = 150.0
+    post_ms: float = 10.0
+    scale: float = 1.0
+
+    def sleep(self, ms: float) -> None:
+        if ms > 0 and self.scale > 0:
+            time.sleep(ms * self.scale / 1000)
+
+
+def _setup_environment(args) -> str:
+    """Environment read by the app at import time; returns the BM25 index path."""
+    os.environ.setdefault("AWS_DEFAULT_REGION", "eu-west-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    os.environ.setdefault("ANTHROPIC_API_KEY", "bench")
+    os.environ["HAYSTACK_TELEMETRY_ENABLED"] = "False"
+    os.environ["COMPACTION_QUEUE"] = "local"
+    os.environ["VECTOR_BACKEND"] = "pinecone"
+    os.environ["SPEND_TOKENS_PER_MINUTE"] = str(10 ** 9)
+    os.environ["SPEND_BURST_TOKENS"] = str(10 ** 9)
+    if args.endpoint_url:
+        os.environ["AWS_ENDPOINT_URL_DYNAMODB"] = args.endpoint_url
+    bm25_path = os.path.join(tempfile.mkdtemp(prefix="chat_bench"), "bm25_index.json")
+    os.environ["BM25_INDEX_PATH"] = bm25_path
+    return bm25_path
+
+
+def create_tables() -> None:
+    import boto3
+
+    client = boto3.client("dynamodb")
+    existing = set(client.list_tables()["TableNames"])
+    tables = {
+        "Conversations": [("PK", "HASH"), ("SK", "RANGE")],
+        "RateLimitBuckets": [("bucket_id", "HASH")],
+        "KnowledgeCache": [("cache_key", "HASH")],
+    }
+    for name, keys in tables.items():
+        if name in existing:
+            continue
+        client.create_table(
+            TableName=name,
+            BillingMode="PAY_PER_REQUEST",
+            KeySchema=[{"AttributeName": k, "KeyType": t} for k, t in keys],
+            AttributeDefinitions=[{"AttributeName": k, "AttributeType": "S"} for k, _ in keys],
+        )
+
+
+def serialize_moto() -> None:
+    """moto's DynamoDB backend is not thread-safe (transactions deep-copy tables others write to)."""
+    from moto.dynamodb.models import DynamoDBBackend
+
+    lock = threading.RLock()
+
+    def locked(method):
+        def wrapper(self, *args, **kwargs):
+            with lock:
+                return method(self, *args, **kwargs)
+        return wrapper
+
+    for name in (
+            "get_item", "put_item", "update_item", "delete_item", "query", "scan",
+            "batch_get_item", "batch_write_item", "transact_get_items", "transact_write_items",
+    ):
+        setattr(DynamoDBBackend, name, locked(getattr(DynamoDBBackend, name)))
+
+
+def corpus(size: int, rng: random.Random) -> List[dict]:
+    records = []
+    for i in range(size):
+        topic, other = rng.sample(TOPICS, 2)
+        words = " ".join(rng.choice(FILLER) for _ in range(120))
+        records.append({"id": f"page{i // 4}#{i % 4}", "text": f"{topic} › {other}\n\nI {words} with {topic}."})
+    return records
+
+
+def script(turns: int, rng: random.Random) -> List[str]:
+    """Roughly 70% knowledge questions, 20% small talk and 10% time questions."""
+    messages = []
+    for _ in range(turns):
+        roll = rng.random()
+        if roll < 0.7:
+            topic, other = rng.sample(TOPICS, 2)
+            messages.append(rng.choice(KNOWLEDGE_TEMPLATES).format(topic=topic, other=other))
+        elif roll < 0.9:
+            messages.append(rng.choice(SMALL_TALK))
+        else:
+            messages.append(rng.choice(TIME_QUESTIONS))
+    return messages
+
+
+class FakeApiGateway:
+    """Stands in for the ``apigatewaymanagementapi`` client the messenger posts frames with."""
+
+    class exceptions:
+        class GoneException(Exception):
+            pass
+
+    def __init__(self, latency: FakeLatency) -> None:
+        self.latency = latency
+        self.posts = 0
+        self._lock = threading.Lock()
+
+    def post_to_connection(self, ConnectionId: str, Data: str) -> dict:
+        self.latency.sleep(self.latency.post_ms)
+        with self._lock:
+            self.posts += 1
+        return {}
+
+
+class FakePineconeIndex:
+    def __init__(self, records: List[dict], latency: FakeLatency) -> None:
+        self.records = records
+        self.latency = latency
+        self.searches = 0
+
+    def search(self, namespace: str, query: dict, rerank: dict):
+        self.latency.sleep(self.latency.pinecone_ms)
+        self.searches += 1
+        terms = set(query["inputs"]["text"].lower().replace("?", "").split())
+        scored = sorted(
+            ((len(terms.intersection(r["text"].lower().split())), r) for r in self.records),
+            key=lambda pair: -pair[0],
+        )[:rerank["top_n"]]
+        hits = [{"_id": r["id"], "_score": score / (len(terms) or 1), "fields": {"text": r["text"]}} for score, r in scored]
+        return type("SearchResponse", (), {"result": {"hits": hits}})()
+
+
+class FakeBedrock:
+    """Nova Micro stand-in for the router classifier, small talk and summary compaction."""
+
+    def __init__(self, model: str, latency: FakeLatency) -> None:
+        self.model = model
+        self.latency = latency
+
+    def run(self, messages, streaming_callback=None, generation_kwargs=None, tools=None) -> dict:
+        from haystack.dataclasses import ChatMessage, StreamingChunk
+
+        self.latency.sleep(self.latency.bedrock_ms)
+        if generation_kwargs and generation_kwargs.get("maxTokens") == 5:
+            text = "small_talk"
+        elif streaming_callback is None:
+            text = "The visitor asked about past projects and I described the relevant work."
+        else:
+            text = "Hey, nice to meet you! What brings you here?"
+            for word in text.split(" "):
+                streaming_callback(StreamingChunk(content=word + " "))
+        usage = {"prompt_tokens": sum(len(m.text or "") for m in messages) // 4, "completion_tokens": len(text) // 4}
+        return {"replies": [ChatMessage.from_assistant(text, meta={"usage": usage})]}
+
+
+class FakeAnthropicStream:
+    """``client.messages.create`` replacement yielding Anthropic stream events with latency."""
+
+    def __init__(self, latency: FakeLatency) -> None:
+        self.latency = latency
+
+    def create(self, **kwargs):
+        messages = kwargs["messages"]
+        last = messages[-1]["content"]
+        answered_tool = any(isinstance(b, dict) and b.get("type") == "tool_result" for b in last)
+        prompt_tokens = len(json.dumps(kwargs.get("system", "")) + json.dumps(messages)) // 4
+        return self._stream(prompt_tokens, None if answered_tool else self._question(last))
+
+    @staticmethod
+    def _question(content) -> str:
+        text = " ".join(b.get("text", "") for b in content if isinstance(b, dict))
+        return text.rsplit("Question:", 1)[-1].strip()[:120]
+
+    def _stream(self, prompt_tokens: int, search_query: Optional[str]):
+        from anthropic.types import (
+            InputJSONDelta, Message, MessageDeltaUsage, RawContentBlockDeltaEvent, RawContentBlockStartEvent,
+            RawMessageDeltaEvent, RawMessageStartEvent, TextBlock, TextDelta, ToolUseBlock, Usage,
+        )
+        from anthropic.types.raw_message_delta_event import Delta
+
+        yield RawMessageStartEvent(type="message_start", message=Message(
+            id=f"msg_{uuid.uuid4().hex}", type="message", role="assistant", model="claude-bench", content=[],
+            stop_reason=None, stop_sequence=None, usage=Usage(input_tokens=prompt_tokens, output_tokens=1),
+        ))
+        self.latency.sleep(self.latency.llm_ttft_ms)
+        if search_query is not None:
+            yield RawContentBlockStartEvent(type="content_block_start", index=0, content_block=ToolUseBlock(
+                type="tool_use", id=f"toolu_{uuid.uuid4().hex[:16]}", name="search_docs", input={},
+            ))
+            yield RawContentBlockDeltaEvent(type="content_block_delta", index=0, delta=InputJSONDelta(
+                type="input_json_delta", partial_json=json.dumps({"query": search_query}),
+            ))
+            output_tokens, stop_reason = 20, "tool_use"
+        else:
+            yield RawContentBlockStartEvent(type="content_block_start", index=0, content_block=TextBlock(type="text", text=""))
+            for i in range(self.latency.llm_output_tokens):
+                if i:
+                    self.latency.sleep(1000 / self.latency.llm_tokens_per_second)
+                yield RawContentBlockDeltaEvent(type="content_block_delta", index=0, delta=TextDelta(
+                    type="text_delta", text=f"{FILLER[i % len(FILLER)]} ",
+                ))
+            output_tokens, stop_reason = self.latency.llm_output_tokens, "end_turn"
+        yield RawMessageDeltaEvent(
+            type="message_delta", delta=Delta(stop_reason=stop_reason, stop_sequence=None),
+            usage=MessageDeltaUsage(output_tokens=output_tokens),
+        )
+
+
+def install_fakes(latency: FakeLatency, records: List[dict], bm25_path: str) -> FakeApiGateway:
+    from haystack_integrations.components.generators.anthropic import AnthropicChatGenerator
+
+    import agents.chat_agent as chat_agent
+    import agents.router as router
+    import knowledge.vector_store as vector_store
+    from knowledge.bm25 import BM25Index
+    from utils import resources
+
+    BM25Index.build(records).save(bm25_path)
+
+    generator = AnthropicChatGenerator(model=chat_agent.CHAT_MODEL)
+    generator.client.messages.create = FakeAnthropicStream(latency).create
+    apigw = FakeApiGateway(latency)
+    bedrock = FakeBedrock(router.ROUTER_MODEL, latency)
+    fakes = {
+        ("anthropic", chat_agent.CHAT_MODEL): generator,
+        ("bedrock", router.ROUTER_MODEL): bedrock,
+        ("bedrock", router.ROUTER_MODEL, "small_talk"): bedrock,
+        ("pinecone", "index", vector_store.INDEX_NAME): FakePineconeIndex(records, latency),
+        ("boto3", "apigatewaymanagementapi", (("endpoint_url", ENDPOINT_URL),)): apigw,
+    }
+    for key, fake in fakes.items():
+        resources.invalidate(key)
+        resources.get_or_create(key, lambda fake=fake: fake)
+    return apigw
+
+
+def lift_rate_limit() -> None:
+    import chat_handler
+    from rate_limiter.leased_bucket import LeasedTokenBucket
+    from rate_limiter.token_bucket import TokenBucket, TokenBucketConfig
+
+    chat_handler._RATE_LIMITER = LeasedTokenBucket(
+        TokenBucket(TokenBucketConfig(rate_per_minute=10 ** 6, burst_size=10 ** 6)),
+        chat_handler._RATE_LIMITER.config,
+    )
+
+
+def message_event(session_id: str, message: str, ip: str) -> dict:
+    return {
+        "requestContext": {
+            "routeKey": "sendMessage",
+            "connectionId": session_id,
+            "domainName": ENDPOINT_URL.removeprefix("https://"),
+            "identity": {"sourceIp": ip},
+        },
+        "body": json.dumps({"message": message}),
+    }
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    sessions: int
+    turns: int
+    wall_seconds: float = 0.0
+    statuses: Dict[str, int] = field(default_factory=dict)
+    latency_ms: Dict[str, float] = field(default_factory=dict)
+    ttft_ms: Dict[str, float] = field(default_factory=dict)
+    dynamodb_calls_per_turn: float = 0.0
+    dynamodb_ops_per_turn: Dict[str, float] = field(default_factory=dict)
+    posts_per_turn: float = 0.0
+    llm_calls_per_turn: float = 0.0
+    compactions: int = 0
+    turns_per_second: float = 0.0
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))]
+
+    return {
+        "p50": round(rank(50), 2), "p95": round(rank(95), 2), "p99": round(rank(99), 2),
+        "mean": round(sum(ordered) / len(ordered), 2), "max": round(ordered[-1], 2),
+    }
+
+
+class EmfCollector:
+    """Collects the handler's EMF lines and tallies the metrics the report needs."""
+
+    def __init__(self) -> None:
+        self.ttft: List[float] = []
+        self.dynamodb_ops: Counter = Counter()
+        self.llm_calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, line: str) -> None:
+        data = json.loads(line)
+        dependency = data.get("Dependency", "")
+        with self._lock:
+            self.ttft.extend(data.get("TimeToFirstToken", []))
+            if dependency.startswith("dynamodb."):
+                self.dynamodb_ops[dependency.removeprefix("dynamodb.")] += len(data["DependencyLatency"])
+            elif dependency.startswith("llm."):
+                self.llm_calls += len(data["DependencyLatency"])
+
+
+def run_scenario(name: str, apigw: FakeApiGateway, rng: random.Random) -> ScenarioResult:
+    import chat_handler
+    from memory.compaction import get_compaction_queue
+    from metrics import metrics
+
+    if name == "single":
+        sessions, turns = 1, 1
+    elif name.startswith("session-"):
+        sessions, turns = 1, int(name.removeprefix("session-"))
+    elif name.startswith("concurrent-"):
+        sessions, turns = (int(n) for n in name.removeprefix("concurrent-").split("x"))
+    else:
+        raise SystemExit(f"unknown scenario {name!r}")
+
+    collector = EmfCollector()
+    metrics.flush()
+    metrics.sink = collector
+    queue = get_compaction_queue()
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    compactions = 0
+    lock = threading.Lock()
+    posts_before = apigw.posts
+    seeds = [rng.random() for _ in range(sessions)]
+
+    def drain_unmeasured() -> int:
+        # The compaction worker runs off the chat path; keep its calls out of the turns' numbers.
+        metrics.flush()
+        metrics.sink = lambda line: None
+        drained = queue.drain()
+        metrics.flush()
+        metrics.sink = collector
+        return drained
+
+    def run_session(index: int) -> None:
+        nonlocal compactions
+        session_id = f"bench-{name}-{index}-{uuid.uuid4().hex[:8]}"
+        ip = f"10.0.{index // 250}.{index % 250 + 1}"
+        for message in script(turns, random.Random(seeds[index])):
+            started = time.perf_counter()
+            response = chat_handler.handler(message_event(session_id, message, ip), None)
+            elapsed = (time.perf_counter() - started) * 1000
+            drained = drain_unmeasured() if sessions == 1 else 0
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(response.get("statusCode"))] += 1
+                compactions += drained
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        list(pool.map(run_session, range(sessions)))
+    wall = time.perf_counter() - started
+    metrics.flush()
+    if sessions > 1:
+        compactions += drain_unmeasured()
+
+    total = sessions * turns
+    return ScenarioResult(
+        name=name,
+        sessions=sessions,
+        turns=total,
+        wall_seconds=round(wall, 2),
+        statuses=dict(statuses),
+        latency_ms=percentiles(latencies),
+        ttft_ms=percentiles(collector.ttft),
+        dynamodb_calls_per_turn=round(sum(collector.dynamodb_ops.values()) / total, 2),
+        dynamodb_ops_per_turn={op: round(n / total, 2) for op, n in sorted(collector.dynamodb_ops.items())},
+        posts_per_turn=round((apigw.posts - posts_before) / total, 2),
+        llm_calls_per_turn=round(collector.llm_calls / total, 2),
+        compactions=compactions,
+        turns_per_second=round(total / wall, 2),
+    )
+
+
+def report(results: List[ScenarioResult], baseline: Optional[dict]) -> None:
+    previous = {s["name"]: s for s in (baseline or {}).get("scenarios", [])}
+
+    def delta(current: Optional[float], before: Optional[float]) -> str:
+        if current is None or before is None or not before:
+            return ""
+        return f" ({(current - before) / before:+.0%})"
+
+    for r in results:
+        before = previous.get(r.name, {})
+        print(f"\n{r.name}: {r.turns} turns in {r.wall_seconds}s ({r.turns_per_second}/s), statuses {r.statuses}")
+        for label, stats, old in (
+                ("turn latency", r.latency_ms, before.get("latency_ms", {})),
+                ("first token ", r.ttft_ms, before.get("ttft_ms", {})),
+        ):
+            cells = "  ".join(f"{p} {stats.get(p, 0):8.1f}ms{delta(stats.get(p), old.get(p))}" for p in ("p50", "p95", "p99"))
+            print(f"  {label}  {cells}")
+        print(f"  per turn: {r.dynamodb_calls_per_turn} DynamoDB calls"
+              f"{delta(r.dynamodb_calls_per_turn, before.get('dynamodb_calls_per_turn'))}, "
+              f"{r.posts_per_turn} posts{delta(r.posts_per_turn, before.get('posts_per_turn'))}, "
+              f"{r.llm_calls_per_turn} LLM calls; {r.compactions} compactions")
+        print(f"  DynamoDB ops per turn: {r.dynamodb_ops_per_turn}")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS)
+    parser.add_argument("--endpoint-url", help="DynamoDB Local endpoint; moto is used when omitted")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiply every fake latency, 0 for none")
+    parser.add_argument("--llm-ttft-ms", type=float, default=FakeLatency.llm_ttft_ms)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=FakeLatency.llm_tokens_per_second)
+    parser.add_argument("--llm-output-tokens", type=int, default=FakeLatency.llm_output_tokens)
+    parser.add_argument("--bedrock-ms", type=float, default=FakeLatency.bedrock_ms)
+    parser.add_argument("--pinecone-ms", type=float, default=FakeLatency.pinecone_ms)
+    parser.add_argument("--post-ms", type=float, default=FakeLatency.post_ms)
+    parser.add_argument("--corpus-size", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help=f"results file (default: a timestamped file in {RESULTS_DIR})")
+    parser.add_argument("--compare", help="earlier results file to print deltas against")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    # App loggers set their own level; filter at the handler so per-turn INFO logs stay quiet.
+    log_handler = logging.StreamHandler()
+    log_handler.setLevel(args.log_level)
+    logging.basicConfig(level=args.log_level, handlers=[log_handler])
+
+    latency = FakeLatency(
+        llm_ttft_ms=args.llm_ttft_ms,
+        llm_tokens_per_second=args.llm_tokens_per_second,
+        llm_output_tokens=args.llm_output_tokens,
+        bedrock_ms=args.bedrock_ms,
+        pinecone_ms=args.pinecone_ms,
+        post_ms=args.post_ms,
+        scale=args.latency_scale,
+    )
+    bm25_path = _setup_environment(args)
+    rng = random.Random(args.seed)
+
+    def run() -> List[ScenarioResult]:
+        create_tables()
+        apigw = install_fakes(latency, corpus(args.corpus_size, rng), bm25_path)
+        lift_rate_limit()
+        import chat_handler
+        from metrics import metrics
+
+        metrics.sink = lambda line: None
+        # Warm-up turn: builds clients, pipelines and indexes as a warm container would have them.
+        chat_handler.handler(message_event("bench-warmup", "What did you build with kafka?", "10.255.0.1"), None)
+        return [run_scenario(name.strip(), apigw, rng) for name in args.scenarios.split(",") if name.strip()]
+
+    if args.endpoint_url:
+        results = run()
+    else:
+        from moto import mock_aws
+
+        serialize_moto()
+        with mock_aws():
+            results = run()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    report(results, baseline)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"chat_bench_{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "backend": "dynamodb-local" if args.endpoint_url else "moto",
+            "latency": asdict(latency),
+            "scenarios": [asdict(r) for r in results],
+        }, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
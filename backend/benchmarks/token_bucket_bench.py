@@ -0,0 +1,126 @@
+"""Benchmark the DynamoDB token bucket against moto (or DynamoDB Local).
+
+Reports DynamoDB requests per ``should_throttle`` call and checks that parallel callers,
+each with their own ``TokenBucket`` as separate Lambda containers would have, never admit
+more than ``burst + rate * elapsed`` requests.
+
+    python backend/benchmarks/token_bucket_bench.py [--endpoint-url http://localhost:8000]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import boto3  # noqa: E402
+
+TABLE = "RateLimitBuckets"
+
+
+def create_table() -> None:
+    client = boto3.client("dynamodb")
+    client.create_table(
+        TableName=TABLE,
+        BillingMode="PAY_PER_REQUEST",
+        KeySchema=[{"AttributeName": "bucket_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "bucket_id", "AttributeType": "S"}],
+    )
+
+
+def serialize_moto_updates() -> None:
+    """moto evaluates a condition and applies the update without a lock; DynamoDB does both atomically."""
+    from moto.dynamodb.models import DynamoDBBackend
+
+    lock = threading.Lock()
+    update_item = DynamoDBBackend.update_item
+
+    def locked_update_item(self, *args, **kwargs):
+        with lock:
+            return update_item(self, *args, **kwargs)
+
+    DynamoDBBackend.update_item = locked_update_item
+
+
+class RequestCounter:
+    def __init__(self) -> None:
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def attach(self, bucket) -> None:
+        bucket.table.meta.client.meta.events.register("before-call.dynamodb.*", self._inc)
+
+    def _inc(self, **_) -> None:
+        with self._lock:
+            self.count += 1
+
+
+def sequential(checks: int) -> None:
+    from rate_limiter.token_bucket import TokenBucket, TokenBucketConfig
+
+    # Burst large enough that every check is admitted and therefore writes.
+    bucket = TokenBucket(TokenBucketConfig(rate_per_minute=600, burst_size=checks))
+    counter = RequestCounter()
+    counter.attach(bucket)
+    start = time.perf_counter()
+    throttled = sum(bucket.should_throttle("seq") for _ in range(checks))
+    elapsed = time.perf_counter() - start
+    print(f"sequential: {checks} checks, {throttled} throttled, "
+          f"{counter.count / checks:.2f} DynamoDB requests/check, {elapsed / checks * 1000:.2f} ms/check")
+
+
+def parallel(callers: int, checks_per_caller: int) -> None:
+    from rate_limiter.token_bucket import TokenBucket, TokenBucketConfig
+
+    config = TokenBucketConfig(rate_per_minute=60, burst_size=5)
+    buckets = [TokenBucket(config) for _ in range(callers)]
+    counter = RequestCounter()
+    for b in buckets:
+        counter.attach(b)
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        results = list(pool.map(
+            lambda b: [b.should_throttle("shared") for _ in range(checks_per_caller)], buckets
+        ))
+    elapsed = time.time() - start
+
+    checks = callers * checks_per_caller
+    allowed = sum(not t for r in results for t in r)
+    limit = config.burst_size + elapsed * config.rate_per_minute / 60
+    status = "OK" if allowed <= limit else "OVERSHOOT"
+    print(f"parallel: {callers} callers x {checks_per_caller} checks, allowed {allowed} "
+          f"(limit {limit:.1f}) {status}, {counter.count / checks:.2f} DynamoDB requests/check")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint-url", help="DynamoDB Local endpoint; moto is used when omitted")
+    parser.add_argument("--checks", type=int, default=200)
+    parser.add_argument("--callers", type=int, default=8)
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_DEFAULT_REGION", "eu-west-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+
+    if args.endpoint_url:
+        os.environ["AWS_ENDPOINT_URL_DYNAMODB"] = args.endpoint_url
+        create_table()
+        sequential(args.checks)
+        parallel(args.callers, args.checks // args.callers)
+        return
+
+    from moto import mock_aws
+
+    serialize_moto_updates()
+    with mock_aws():
+        create_table()
+        sequential(args.checks)
+        parallel(args.callers, args.checks // args.callers)
+
+
+if __name__ == "__main__":
+    main()
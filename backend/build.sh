@@ -32,6 +32,14 @@ find "$ROOT" -type d \( -name "tests" -o -name "test" -o -name "testing" -o -nam
 find "$ROOT" -path "*/googleapiclient/discovery_cache/documents" -type d -prune -exec rm -rf {} +
 find "$ROOT" -maxdepth 2 -type f -name "*.whl" -delete
 
+# Search indexes shipped with the package, built from the current Notion content
+if [[ -n "${NOTION_API_KEY:-}" && -n "${NOTION_DB_ID:-}" ]]; then
+  poetry install --no-root --only main
+  (cd app && poetry run python notion_script.py --package-indexes-only)
+elif [[ ! -f app/knowledge/bm25_index.json ]]; then
+  echo 'NOTION_API_KEY/NOTION_DB_ID not set and no app/knowledge/bm25_index.json: retrieval will be dense-only' >&2
+fi
+
 # Copy your code
 cp -rv app/* dist/
 
@@ -14,6 +14,11 @@ resource "aws_dynamodb_table" "conversation_table" {
     type = "S"
   }
 
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
   lifecycle {
     prevent_destroy = false
   }
@@ -28,4 +33,25 @@ resource "aws_dynamodb_table" "rate_limit_table" {
     name = "bucket_id"
     type = "S"
   }
-}
\ No newline at end of file
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+}
+
+resource "aws_dynamodb_table" "knowledge_cache_table" {
+  name         = "KnowledgeCache"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "cache_key"
+
+  attribute {
+    name = "cache_key"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+}
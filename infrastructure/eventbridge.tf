@@ -51,3 +51,28 @@ resource "aws_lambda_event_source_mapping" "conversation_end_mapping" {
   function_name    = aws_lambda_function.conversation_summary_handler.arn
   batch_size       = 1
 }
+
+############
+# SummaryCompactionRequested
+############
+resource "aws_cloudwatch_event_rule" "summary_compaction_rule" {
+  name           = "summary-compaction-requested"
+  event_bus_name = aws_cloudwatch_event_bus.minime.name
+  event_pattern = jsonencode({
+    source = ["minime.chat"],
+    "detail-type" = ["SummaryCompactionRequested"]
+  })
+}
+
+resource "aws_cloudwatch_event_target" "summary_compaction_target" {
+  event_bus_name = aws_cloudwatch_event_bus.minime.name
+  rule           = aws_cloudwatch_event_rule.summary_compaction_rule.name
+  target_id      = "queue"
+  arn            = aws_sqs_queue.summary_compaction_queue.arn
+}
+
+resource "aws_lambda_event_source_mapping" "summary_compaction_mapping" {
+  event_source_arn = aws_sqs_queue.summary_compaction_queue.arn
+  function_name    = aws_lambda_function.summary_compaction_handler.arn
+  batch_size       = 1
+}
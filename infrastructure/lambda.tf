@@ -131,6 +131,42 @@ resource "aws_lambda_function" "ip_geolocation_handler" {
   }
 }
 
+############
+# summary_compaction_handler
+############
+resource "aws_lambda_function" "summary_compaction_handler" {
+  function_name    = "summary_compaction_handler"
+  runtime          = "python3.11"
+  handler          = "summary_compaction_handler.handler"
+  s3_bucket        = aws_s3_bucket.lambda_code_bucket.id
+  s3_key           = aws_s3_object.lambda_package.key
+  source_code_hash = filebase64sha256("../backend/lambda_package.zip")
+  timeout          = 120
+  memory_size      = 512
+
+  role = aws_iam_role.lambda_exec.arn
+
+  layers = [
+    "arn:aws:lambda:${data.aws_region.current.name}:901920570463:layer:aws-otel-python-amd64-ver-1-32-0:2"
+  ]
+
+  environment {
+    variables = {
+      OTEL_LOGS_EXPORTER                               = "otlp"
+      OTEL_EXPORTER_OTLP_ENDPOINT                      = "https://otlp.eu01.nr-data.net:4317"
+      OTEL_EXPORTER_OTLP_HEADERS                       = "api-key=${var.newrelic_license_key}"
+      OTEL_SERVICE_NAME                                = "summary_compaction_handler"
+      OTEL_LAMBDA_DISABLE_AWS_CONTEXT_PROPAGATION      = true
+      OTEL_LOG_LEVEL                                   = "INFO"
+      OTEL_PYTHON_LOGGING_AUTO_INSTRUMENTATION_ENABLED = true
+      AWS_LAMBDA_EXEC_WRAPPER                          = "/opt/otel-instrument"
+      ENABLE_FS_INSTRUMENTATION                        = false
+      OTEL_PYTHON_DISABLED_INSTRUMENTATIONS            = "pymongo,pymysql,pyramid,redis,sqlalchemy,starlette,tornado,flask,grpc,jinja2,mysql,psycopg2,pymemcache"
+      HAYSTACK_TELEMETRY_ENABLED                       = "False"
+    }
+  }
+}
+
 ############
 # lambda role
 ############
@@ -32,4 +32,22 @@ resource "aws_sqs_queue" "conversation_end_queue" {
       }
     ]
   })
-}
\ No newline at end of file
+}
+
+resource "aws_sqs_queue" "summary_compaction_queue" {
+  name = "summary-compaction-queue"
+
+  visibility_timeout_seconds = 200
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      {
+        Effect   = "Allow",
+        Principal = { Service = "events.amazonaws.com" },
+        Action   = "sqs:SendMessage",
+        Resource = "*"
+      }
+    ]
+  })
+}